@@ -0,0 +1,29 @@
+"""Add reporter_email_is_placeholder to tickets
+
+Revision ID: 005_ticket_placeholder_email
+Revises: 004_reporters_providers
+Create Date: 2026-03-02
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '005_ticket_placeholder_email'
+down_revision: Union[str, None] = '004_reporters_providers'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('tickets', sa.Column('reporter_email_is_placeholder', sa.Boolean(), nullable=False, server_default='false'))
+    
+    # Backfill tickets created from WhatsApp with a generated email
+    op.execute("UPDATE tickets SET reporter_email_is_placeholder = true WHERE reporter_email LIKE '%@wa.placeholder.com'")
+
+
+def downgrade() -> None:
+    op.drop_column('tickets', 'reporter_email_is_placeholder')
@@ -0,0 +1,25 @@
+"""Add composite index on tickets (reporter_phone, status)
+
+Revision ID: 006_ticket_phone_status_index
+Revises: 005_ticket_placeholder_email
+Create Date: 2026-03-02
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '006_ticket_phone_status_index'
+down_revision: Union[str, None] = '005_ticket_placeholder_email'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_tickets_reporter_phone_status', 'tickets', ['reporter_phone', 'status'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tickets_reporter_phone_status', table_name='tickets')
@@ -0,0 +1,25 @@
+"""Add index on reporters.phone
+
+Revision ID: 007_reporter_phone_index
+Revises: 006_ticket_phone_status_index
+Create Date: 2026-03-02
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '007_reporter_phone_index'
+down_revision: Union[str, None] = '006_ticket_phone_status_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_reporters_phone', 'reporters', ['phone'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_reporters_phone', table_name='reporters')
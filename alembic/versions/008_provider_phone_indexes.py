@@ -0,0 +1,27 @@
+"""Add indexes on providers.phone and providers.phone_emergency
+
+Revision ID: 008_provider_phone_indexes
+Revises: 007_reporter_phone_index
+Create Date: 2026-03-03
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '008_provider_phone_indexes'
+down_revision: Union[str, None] = '007_reporter_phone_index'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_providers_phone', 'providers', ['phone'])
+    op.create_index('ix_providers_phone_emergency', 'providers', ['phone_emergency'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_providers_phone_emergency', table_name='providers')
+    op.drop_index('ix_providers_phone', table_name='providers')
@@ -26,11 +26,21 @@ class Settings(BaseSettings):
             return v.replace("postgresql://", "postgresql+asyncpg://", 1)
         return v
     
+    # Database connection pool, per process: each uvicorn worker can open up to
+    # db_pool_size + db_max_overflow connections. Keep workers x that total
+    # below the server's max_connections (100 by default on Postgres) and
+    # raise it per deployment with DB_POOL_SIZE / DB_MAX_OVERFLOW
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_recycle: int = 1800  # seconds
+    db_pool_timeout: float = 10.0  # Seconds to wait for a free connection before failing
+    
     # IMAP Configuration
     imap_host: str = "imap.gmail.com"
     imap_port: int = 993
     imap_user: str = ""
     imap_password: str = ""
+    imap_fetch_batch_size: int = 100  # UIDs per FETCH command
     
     # SMTP Configuration (defaults to IMAP credentials for Gmail)
     # Port 465 with SSL works better in cloud environments than 587 with STARTTLS
@@ -56,6 +66,11 @@ class Settings(BaseSettings):
     # Email provider: "smtp", "resend", or "sendgrid"
     email_provider: str = "smtp"
     
+    # Outbound email throttling for HTTP providers (Resend allows 10 requests/second)
+    email_rate_per_second: float = 10.0
+    email_max_concurrency: int = 5
+    email_max_retries: int = 3
+    
     @property
     def effective_smtp_user(self) -> str:
         """Get SMTP user, falling back to IMAP user"""
@@ -73,10 +88,14 @@ class Settings(BaseSettings):
     
     # Worker settings
     poll_interval_seconds: int = 60
+    imap_use_idle: bool = True  # Wait with IMAP IDLE between polls when supported
+    email_processing_concurrency: int = 8  # Senders processed in parallel per poll
     
     # OpenAI Configuration
     openai_api_key: str = ""
     openai_model: str = "gpt-4o-mini"
+    openai_intent_model: str = ""  # Faster model for WhatsApp classification calls (empty = openai_model)
+    llm_intent_timeout: float = 4.0  # Seconds per WhatsApp classification call (doubled on retry)
     
     # Twilio Configuration (for WhatsApp)
     twilio_account_sid: str = ""
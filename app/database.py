@@ -18,8 +18,12 @@ engine = create_async_engine(
     settings.database_url,
     echo=settings.debug,
     pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=10,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.db_max_overflow,
+    pool_recycle=settings.db_pool_recycle,
+    pool_timeout=settings.db_pool_timeout,
+    # Short OLTP queries only - Postgres JIT adds planning overhead without benefit
+    connect_args={"server_settings": {"jit": "off"}},
 )
 
 # Create async session factory
@@ -49,6 +49,9 @@ async def lifespan(app: FastAPI):
     if use_imap:
         from app.services.email_worker import stop_email_worker
         await stop_email_worker()
+    from app.services.email_service import close_http_client, close_smtp_client
+    await close_smtp_client()
+    await close_http_client()
     await close_db()
 
 
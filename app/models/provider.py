@@ -25,9 +25,9 @@ class Provider(Base):
     
     # Contact info
     email: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
-    phone: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
+    phone: Mapped[Optional[str]] = mapped_column(String(50), nullable=True, index=True)
     phone_secondary: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
-    phone_emergency: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)  # Para urgencias
+    phone_emergency: Mapped[Optional[str]] = mapped_column(String(50), nullable=True, index=True)  # Para urgencias
     
     # Contact person
     contact_person: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
@@ -17,13 +17,15 @@ class Reporter(Base):
     """
     
     __tablename__ = "reporters"
+    # Fetch server defaults in the INSERT (RETURNING) instead of a refresh
+    __mapper_args__ = {"eager_defaults": True}
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     
     # Basic info
     name: Mapped[str] = mapped_column(String(255), nullable=False)
     email: Mapped[str] = mapped_column(String(255), nullable=False, unique=True, index=True)
-    phone: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
+    phone: Mapped[Optional[str]] = mapped_column(String(50), nullable=True, index=True)
     phone_secondary: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
     
     # Community/Property info
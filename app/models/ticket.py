@@ -5,7 +5,8 @@ import enum
 from datetime import datetime
 from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
-from sqlalchemy import DateTime, Enum, String, Text, func, JSON
+from sqlalchemy import Boolean, DateTime, Enum, Index, String, Text, func, JSON, false
+from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base
@@ -61,6 +62,12 @@ class Ticket(Base):
     """Ticket model for incident tracking"""
     
     __tablename__ = "tickets"
+    # Fetch server-generated timestamps (updated_at on UPDATE too) via RETURNING
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (
+        # WhatsApp lookups filter by reporter phone (IN variants) and status
+        Index("ix_tickets_reporter_phone_status", "reporter_phone", "status"),
+    )
     
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     ticket_code: Mapped[str] = mapped_column(
@@ -78,6 +85,10 @@ class Ticket(Base):
         Enum(Priority), default=Priority.MEDIUM, nullable=False
     )
     reporter_email: Mapped[str] = mapped_column(String(255), nullable=False, index=True)
+    # True when reporter_email is a generated WhatsApp placeholder, not a real address
+    reporter_email_is_placeholder: Mapped[bool] = mapped_column(
+        Boolean, default=False, server_default=false(), nullable=False
+    )
     reporter_name: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
     reporter_phone: Mapped[Optional[str]] = mapped_column(String(50), nullable=True)
     assigned_provider_id: Mapped[Optional[int]] = mapped_column(nullable=True)
@@ -91,7 +102,8 @@ class Ticket(Base):
     location_detail: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
     
     # AI analysis context (stores conversation state for info gathering)
-    ai_context: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON, nullable=True)
+    # MutableDict tracks top-level key assignments made in place
+    ai_context: Mapped[Optional[Dict[str, Any]]] = mapped_column(MutableDict.as_mutable(JSON), nullable=True)
     
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
@@ -13,6 +13,7 @@ from app.models.provider import Provider
 from app.models.reporter import Reporter
 from app.models.event import Event
 from app.models.email import Email
+from app.services.ticket_service import clear_default_provider_cache
 
 router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 templates = Jinja2Templates(directory="templates")
@@ -475,6 +476,7 @@ async def create_provider(
     )
     db.add(provider)
     await db.commit()
+    clear_default_provider_cache()
     
     return RedirectResponse(url="/dashboard/providers", status_code=303)
 
@@ -538,6 +540,7 @@ async def update_provider(
         provider.bank_account = bank_account or None
         provider.notes = notes or None
         await db.commit()
+        clear_default_provider_cache()
     
     return RedirectResponse(url="/dashboard/providers", status_code=303)
 
@@ -551,6 +554,7 @@ async def delete_provider(provider_id: int, db: AsyncSession = Depends(get_db)):
     if provider:
         await db.delete(provider)
         await db.commit()
+        clear_default_provider_cache()
     
     return RedirectResponse(url="/dashboard/providers", status_code=303)
 
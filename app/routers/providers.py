@@ -17,6 +17,7 @@ from app.schemas import (
     ProviderResponse,
     ProviderUpdate,
 )
+from app.services.ticket_service import clear_default_provider_cache
 
 router = APIRouter()
 
@@ -131,6 +132,7 @@ async def create_provider(
     db.add(provider)
     await db.commit()
     await db.refresh(provider)
+    clear_default_provider_cache()
     
     return ProviderResponse.model_validate(provider)
 
@@ -168,6 +170,7 @@ async def update_provider(
     
     await db.commit()
     await db.refresh(provider)
+    clear_default_provider_cache()
     
     return ProviderResponse.model_validate(provider)
 
@@ -183,3 +186,4 @@ async def delete_provider(provider_id: int, db: AsyncSession = Depends(get_db)):
     
     await db.delete(provider)
     await db.commit()
+    clear_default_provider_cache()
@@ -83,7 +83,6 @@ async def submit_incident(
                 )
                 db.add(reporter)
                 await db.commit()
-                await db.refresh(reporter)
                 logger.info("Created new reporter from form: %s", email_lower)
             else:
                 # Update reporter with any new info
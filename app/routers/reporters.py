@@ -5,7 +5,7 @@ import math
 from typing import Optional
 
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import func, select
+from sqlalchemy import exists, func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
@@ -127,10 +127,7 @@ async def create_reporter(
 ):
     """Create a new reporter"""
     # Check if email already exists
-    existing = await db.execute(
-        select(Reporter).where(Reporter.email == reporter_data.email)
-    )
-    if existing.scalar_one_or_none():
+    if await db.scalar(select(exists().where(Reporter.email == reporter_data.email))):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     reporter = Reporter(**reporter_data.model_dump())
@@ -156,10 +153,7 @@ async def update_reporter(
     
     # Check if email already exists (if changing email)
     if reporter_data.email and reporter_data.email != reporter.email:
-        existing = await db.execute(
-            select(Reporter).where(Reporter.email == reporter_data.email)
-        )
-        if existing.scalar_one_or_none():
+        if await db.scalar(select(exists().where(Reporter.email == reporter_data.email))):
             raise HTTPException(status_code=400, detail="Email already registered")
     
     update_data = reporter_data.model_dump(exclude_unset=True)
@@ -236,18 +230,12 @@ async def seed_reporters_from_tickets(
         email = ticket.reporter_email.lower().strip()
         
         # Check if email belongs to a provider - skip to avoid mixing data
-        provider_check = await db.execute(
-            select(Provider).where(Provider.email == email)
-        )
-        if provider_check.scalar_one_or_none():
+        if await db.scalar(select(exists().where(Provider.email == email))):
             skipped_provider.append(email)
             continue
         
         # Check if reporter already exists
-        existing = await db.execute(
-            select(Reporter).where(Reporter.email == email)
-        )
-        if existing.scalar_one_or_none():
+        if await db.scalar(select(exists().where(Reporter.email == email))):
             skipped.append(email)
             continue
         
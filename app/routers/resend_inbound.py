@@ -5,6 +5,7 @@ Receives emails sent to incidencias@adminsavia.com via Resend's inbound feature
 import hashlib
 import hmac
 import logging
+import re
 from typing import Optional, List, Dict, Any
 from datetime import datetime, timezone
 
@@ -30,6 +31,13 @@ router = APIRouter()
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Precompiled patterns used on every inbound webhook
+_TICKET_CODE_RE = re.compile(r'INC-[A-Z0-9]{6}')
+_REPLY_PREFIX_RE = re.compile(r'^(Re:|Fwd:|RV:|RE:|FW:)\s*', re.IGNORECASE)
+
+# Only the most recent References entries are worth looking up
+MAX_REFERENCES = 20
+
 
 class ResendEmailHeader(BaseModel):
     name: str
@@ -147,8 +155,8 @@ async def resend_inbound_webhook(
         in_reply_to = get_header_value(headers, "In-Reply-To")
         references = get_header_value(headers, "References")
         
-        logger.info("Processing inbound email: from=%s, to=%s, subject=%s", 
-                   from_address, to_addresses, subject[:50])
+        logger.info("Processing inbound email: from=%s, to=%s, subject=%.50s", 
+                   from_address, to_addresses, subject)
         
         # Check if this email is from a provider (reply to ticket)
         provider = await _find_provider_by_email(db, from_address)
@@ -191,6 +199,32 @@ async def _find_provider_by_email(db: AsyncSession, email_address: str) -> Optio
     return result.scalar_one_or_none()
 
 
+async def _find_ticket_by_thread(
+    db: AsyncSession,
+    in_reply_to: Optional[str],
+    references: Optional[str],
+) -> Optional[Ticket]:
+    """Resolve In-Reply-To and References to a ticket with a single query"""
+    ref_ids = references.split()[-MAX_REFERENCES:] if references else []
+    candidate_ids = list(dict.fromkeys(([in_reply_to] if in_reply_to else []) + ref_ids))
+    if not candidate_ids:
+        return None
+    
+    result = await db.execute(
+        select(Email.message_id, Ticket)
+        .join(Ticket, Email.ticket_id == Ticket.id)
+        .where(Email.message_id.in_(candidate_ids))
+    )
+    tickets_by_message_id = {row[0]: row[1] for row in result.all()}
+    
+    # In-Reply-To wins, then the most recent reference
+    for message_id in ([in_reply_to] if in_reply_to else []) + ref_ids[::-1]:
+        ticket = tickets_by_message_id.get(message_id)
+        if ticket:
+            return ticket
+    return None
+
+
 async def _process_provider_reply(
     db: AsyncSession,
     provider: Provider,
@@ -206,22 +240,13 @@ async def _process_provider_reply(
     # Try to find the ticket from In-Reply-To or References
     ticket = None
     
-    if in_reply_to:
-        # Find email with this message_id
-        result = await db.execute(
-            select(Email).where(Email.message_id == in_reply_to)
-        )
-        original_email = result.scalar_one_or_none()
-        if original_email and original_email.ticket_id:
-            result = await db.execute(
-                select(Ticket).where(Ticket.id == original_email.ticket_id)
-            )
-            ticket = result.scalar_one_or_none()
+    if in_reply_to or references:
+        # Find the ticket of the email this one replies to
+        ticket = await _find_ticket_by_thread(db, in_reply_to, references)
     
     # Also try to extract ticket code from subject
     if not ticket:
-        import re
-        match = re.search(r'INC-[A-Z0-9]{6}', subject)
+        match = _TICKET_CODE_RE.search(subject)
         if match:
             ticket_code = match.group()
             result = await db.execute(
@@ -285,24 +310,15 @@ async def _process_incident_email(
     # Check if this is a reply to an existing ticket
     existing_ticket = None
     
-    # Method 1: Check In-Reply-To header
-    if in_reply_to:
-        result = await db.execute(
-            select(Email).where(Email.message_id == in_reply_to)
-        )
-        original_email = result.scalar_one_or_none()
-        if original_email and original_email.ticket_id:
-            result = await db.execute(
-                select(Ticket).where(Ticket.id == original_email.ticket_id)
-            )
-            existing_ticket = result.scalar_one_or_none()
-            if existing_ticket:
-                logger.info("Found existing ticket via In-Reply-To: %s", existing_ticket.ticket_code)
+    # Method 1: Check In-Reply-To / References headers
+    if in_reply_to or references:
+        existing_ticket = await _find_ticket_by_thread(db, in_reply_to, references)
+        if existing_ticket:
+            logger.info("Found existing ticket via threading headers: %s", existing_ticket.ticket_code)
     
     # Method 2: Check for ticket code in subject
     if not existing_ticket:
-        import re
-        match = re.search(r'INC-[A-Z0-9]{6}', subject)
+        match = _TICKET_CODE_RE.search(subject)
         if match:
             ticket_code = match.group()
             result = await db.execute(
@@ -322,7 +338,7 @@ async def _process_incident_email(
         cutoff_time = datetime.now(timezone.utc) - timedelta(hours=48)
         
         # Clean subject for comparison (remove Re:, Fwd:, etc.)
-        clean_subject = re.sub(r'^(Re:|Fwd:|RV:|RE:|FW:)\s*', '', subject, flags=re.IGNORECASE).strip()
+        clean_subject = _REPLY_PREFIX_RE.sub('', subject).strip()
         
         result = await db.execute(
             select(Ticket)
@@ -340,7 +356,7 @@ async def _process_incident_email(
         
         # Check if any recent ticket has a similar subject
         for ticket in recent_tickets:
-            ticket_subject_clean = re.sub(r'^(Re:|Fwd:|RV:|RE:|FW:)\s*', '', ticket.subject or '', flags=re.IGNORECASE).strip()
+            ticket_subject_clean = _REPLY_PREFIX_RE.sub('', ticket.subject or '').strip()
             # Check if subjects match (ignoring case and Re:/Fwd: prefixes)
             if clean_subject.lower() == ticket_subject_clean.lower():
                 existing_ticket = ticket
@@ -531,7 +547,6 @@ async def _create_ticket_from_email(
         )
         db.add(reporter)
         await db.commit()
-        await db.refresh(reporter)
         logger.info("Created new reporter from email: %s", sender_email)
     
     # Use AI to analyze the incident
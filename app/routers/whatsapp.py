@@ -37,7 +37,7 @@ async def whatsapp_webhook(
     - ProfileName: The sender's WhatsApp profile name (if available)
     - NumMedia: Number of media attachments
     """
-    logger.info("Received WhatsApp webhook: From=%s, Body=%s", From, Body[:50] if Body else "")
+    logger.info("Received WhatsApp webhook: From=%s, Body=%.50s", From, Body or "")
     
     # Validate the request signature (optional but recommended for production)
     # signature = request.headers.get("X-Twilio-Signature", "")
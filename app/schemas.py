@@ -25,7 +25,9 @@ class TicketBase(BaseModel):
 
 class TicketCreate(TicketBase):
     """Schema for creating a ticket"""
-    pass
+    reporter_phone: Optional[str] = Field(None, max_length=50)
+    address: Optional[str] = Field(None, max_length=500)
+    location_detail: Optional[str] = Field(None, max_length=500)
 
 
 class TicketUpdate(BaseModel):
@@ -1,9 +1,15 @@
 """
 AI Agent Service - Intelligent incident analysis and information gathering using OpenAI
 """
+import hashlib
 import json
 import logging
-from dataclasses import dataclass
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from functools import lru_cache
 from typing import Dict, List, Optional, Tuple
 
 from openai import AsyncOpenAI
@@ -115,11 +121,103 @@ NOTA IMPORTANTE: El número de teléfono es ESENCIAL para poder contactar y coor
 Sé amable y profesional. Las preguntas deben ser claras y en español."""
 
 
+# Analyses for identical inputs (same message, sender and conversation),
+# e.g. webhook retries or a report sent twice
+ANALYSIS_CACHE_SIZE = 1024
+ANALYSIS_CACHE_TTL = 900  # seconds
+_analysis_cache: "OrderedDict[str, Tuple[float, IncidentAnalysis]]" = OrderedDict()
+_CACHE_NOISE_RE = re.compile(r"[^\w]+")
+
+
+def _cache_text(text: Optional[str]) -> str:
+    """Text as used in the analysis cache key: case, accents, punctuation and
+    spacing don't change the analysis, so "No hay agua!!" == "no hay agua" """
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _CACHE_NOISE_RE.sub(" ", text).strip()
+
+
+def _copy_analysis(analysis: IncidentAnalysis) -> IncidentAnalysis:
+    """Copy with fresh containers so callers can't mutate a cached analysis"""
+    return replace(
+        analysis,
+        missing_fields=list(analysis.missing_fields),
+        extracted_info=dict(analysis.extracted_info),
+        follow_up_questions=list(analysis.follow_up_questions),
+    )
+
+
+# Only the most recent turns are re-sent to the model so prompt size (and
+# latency) stays bounded on long conversations
+MAX_HISTORY_MESSAGES = 8
+# Turns kept in ticket.ai_context, so the JSON rewritten on each reply stays
+# bounded (the first message is also kept as the ticket description)
+MAX_STORED_HISTORY_MESSAGES = 20
+
+
+def _recent_history(
+    conversation_history: Optional[List[Dict[str, str]]],
+    summary: Optional[str] = None,
+) -> List[Dict[str, str]]:
+    """Last MAX_HISTORY_MESSAGES messages, prefixed with the summary when older ones are dropped"""
+    if not conversation_history:
+        return []
+    if len(conversation_history) <= MAX_HISTORY_MESSAGES:
+        return list(conversation_history)
+    recent = conversation_history[-MAX_HISTORY_MESSAGES:]
+    if summary:
+        return [{"role": "system", "content": f"Resumen de la conversación anterior: {summary}"}, *recent]
+    return recent
+
+
+# known_data key -> label shown in follow-up emails
+_KNOWN_DATA_LABELS = (
+    ("name", "Nombre"),
+    ("phone", "Teléfono"),
+    ("email", "Email"),
+    ("community", "Comunidad"),
+    ("address", "Dirección"),
+    ("floor_door", "Piso/Puerta"),
+)
+# known_data key -> words of a follow-up question asking for it again
+_KNOWN_DATA_QUESTION_KEYWORDS = {
+    "phone": ("teléfono", "telefono", "contactar"),
+    "name": ("nombre",),
+    "address": ("dirección",),
+    "community": ("comunidad",),
+}
+
+
+@lru_cache(maxsize=16)
+def _known_data_question_re(known_keys: frozenset) -> Optional[re.Pattern]:
+    """Regex matching questions about data we already have (None if nothing is known)"""
+    keywords = [kw for key in sorted(known_keys) for kw in _KNOWN_DATA_QUESTION_KEYWORDS[key]]
+    return re.compile("|".join(map(re.escape, keywords))) if keywords else None
+
+
+def _filter_known_questions(questions: List[str], known_data: dict) -> List[str]:
+    """Drop follow-up questions asking for data we already have"""
+    skip_re = _known_data_question_re(
+        frozenset(key for key in _KNOWN_DATA_QUESTION_KEYWORDS if known_data.get(key))
+    )
+    if not skip_re:
+        return list(questions)
+    return [q for q in questions if not skip_re.search(q.lower())]
+
+
+@lru_cache(maxsize=1)
+def _openai_client() -> Optional[AsyncOpenAI]:
+    """Shared OpenAI client so every service instance reuses one connection pool"""
+    return AsyncOpenAI(api_key=settings.openai_api_key) if settings.openai_api_key else None
+
+
 class AIAgentService:
     """Service for intelligent incident analysis using OpenAI"""
     
     def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.openai_api_key) if settings.openai_api_key else None
+        self.client = _openai_client()
         self.model = settings.openai_model
     
     async def analyze_incident(
@@ -147,14 +245,29 @@ class AIAgentService:
             logger.warning("OpenAI not configured, using fallback analysis")
             return self._fallback_analysis(subject, body, sender_email, sender_name)
         
+        history = _recent_history(conversation_history)
+        cache_key = hashlib.blake2b(
+            json.dumps(
+                [
+                    self.model, _cache_text(subject), _cache_text(body), sender_email, sender_name,
+                    [[msg.get("role"), _cache_text(msg.get("content"))] for msg in history],
+                ],
+                ensure_ascii=False,
+            ).encode(),
+            digest_size=16,
+        ).hexdigest()
+        cached = _analysis_cache.get(cache_key)
+        if cached and cached[0] > time.monotonic():
+            _analysis_cache.move_to_end(cache_key)
+            logger.info("Using cached incident analysis")
+            return _copy_analysis(cached[1])
+        
         try:
             # Build the conversation context
             messages = [{"role": "system", "content": SYSTEM_PROMPT}]
             
             # Add conversation history if this is a follow-up
-            if conversation_history:
-                for msg in conversation_history:
-                    messages.append(msg)
+            messages.extend(history)
             
             # Build the current message
             user_message = self._build_analysis_prompt(subject, body, sender_email, sender_name)
@@ -171,7 +284,7 @@ class AIAgentService:
             # Parse response
             result = json.loads(response.choices[0].message.content)
             
-            return IncidentAnalysis(
+            analysis = IncidentAnalysis(
                 has_complete_info=result.get("has_complete_info", False),
                 category=Category[result["category"]] if result.get("category") else None,
                 priority=Priority[result["priority"]] if result.get("priority") else Priority.MEDIUM,
@@ -181,6 +294,13 @@ class AIAgentService:
                 summary=result.get("summary", ""),
             )
             
+            # Only successful LLM answers are cached, never the fallback
+            _analysis_cache[cache_key] = (time.monotonic() + ANALYSIS_CACHE_TTL, _copy_analysis(analysis))
+            _analysis_cache.move_to_end(cache_key)
+            if len(_analysis_cache) > ANALYSIS_CACHE_SIZE:
+                _analysis_cache.popitem(last=False)
+            return analysis
+            
         except Exception as e:
             logger.error("Error analyzing incident with OpenAI: %s", str(e))
             return self._fallback_analysis(subject, body, sender_email, sender_name)
@@ -229,39 +349,14 @@ Si falta información, genera las preguntas que debemos hacer al reportante.
         
         try:
             # Build known data text for inclusion
-            known_items = []
-            if known_data.get("name"):
-                known_items.append(f"- Nombre: {known_data['name']}")
-            if known_data.get("phone"):
-                known_items.append(f"- Teléfono: {known_data['phone']}")
-            if known_data.get("email"):
-                known_items.append(f"- Email: {known_data['email']}")
-            if known_data.get("community"):
-                known_items.append(f"- Comunidad: {known_data['community']}")
-            if known_data.get("address"):
-                known_items.append(f"- Dirección: {known_data['address']}")
-            if known_data.get("floor_door"):
-                known_items.append(f"- Piso/Puerta: {known_data['floor_door']}")
+            known_items = [f"- {label}: {known_data[key]}" for key, label in _KNOWN_DATA_LABELS if known_data.get(key)]
             
             known_data_text = ""
             if known_items:
                 known_data_text = f"\n\nDATOS QUE YA TENEMOS REGISTRADOS (confirmar si son correctos):\n" + "\n".join(known_items)
             
             # Filter questions for info we already have
-            filtered_questions = []
-            for q in analysis.follow_up_questions:
-                q_lower = q.lower()
-                skip = False
-                if known_data.get("phone") and ("teléfono" in q_lower or "telefono" in q_lower or "contactar" in q_lower):
-                    skip = True
-                if known_data.get("name") and "nombre" in q_lower:
-                    skip = True
-                if known_data.get("address") and "dirección" in q_lower:
-                    skip = True
-                if known_data.get("community") and "comunidad" in q_lower:
-                    skip = True
-                if not skip:
-                    filtered_questions.append(q)
+            filtered_questions = _filter_known_questions(analysis.follow_up_questions, known_data)
             
             questions_text = "\n".join(f"- {q}" for q in filtered_questions) if filtered_questions else "(Por favor confirme los datos mostrados)"
             
@@ -359,34 +454,16 @@ Responde en JSON con: {{"subject": "asunto", "body": "cuerpo del email"}}"""
         
         # Build known data section
         known_section = ""
-        known_items = []
-        if known_data.get("name"):
-            known_items.append(f"- Nombre: {known_data['name']}")
-        if known_data.get("phone"):
-            known_items.append(f"- Teléfono: {known_data['phone']}")
-        if known_data.get("community"):
-            known_items.append(f"- Comunidad: {known_data['community']}")
-        if known_data.get("address"):
-            known_items.append(f"- Dirección: {known_data['address']}")
-        if known_data.get("floor_door"):
-            known_items.append(f"- Piso/Puerta: {known_data['floor_door']}")
+        known_items = [
+            f"- {label}: {known_data[key]}" for key, label in _KNOWN_DATA_LABELS
+            if key != "email" and known_data.get(key)
+        ]
         
         if known_items:
             known_section = "\n\nSus datos registrados:\n" + "\n".join(known_items) + "\n\nPor favor, confírmenos si estos datos son correctos."
         
         # Filter questions we already have answers for
-        filtered_questions = []
-        for q in analysis.follow_up_questions:
-            q_lower = q.lower()
-            skip = False
-            if known_data.get("phone") and ("teléfono" in q_lower or "telefono" in q_lower):
-                skip = True
-            if known_data.get("name") and "nombre" in q_lower:
-                skip = True
-            if known_data.get("address") and "dirección" in q_lower:
-                skip = True
-            if not skip:
-                filtered_questions.append(q)
+        filtered_questions = _filter_known_questions(analysis.follow_up_questions, known_data)
         
         questions = "\n".join(f"{i+1}. {q}" for i, q in enumerate(filtered_questions)) if filtered_questions else ""
         
@@ -459,9 +536,8 @@ Actualiza el análisis con la nueva información. Determina si ahora tenemos tod
                 {"role": "system", "content": SYSTEM_PROMPT},
             ]
             
-            # Add conversation history
-            for msg in conversation_history:
-                messages.append(msg)
+            # Add conversation history (older turns condensed into the previous summary)
+            messages.extend(_recent_history(conversation_history, original_analysis.summary))
             
             messages.append({"role": "user", "content": prompt})
             
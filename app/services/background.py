@@ -0,0 +1,15 @@
+"""
+Background tasks - fire-and-forget helper shared by the services
+"""
+import asyncio
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected
+_background_tasks: set = set()
+
+
+def spawn_background(coro) -> asyncio.Task:
+    """Run a coroutine in the background, keeping a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
@@ -1,12 +1,30 @@
 """
 Classifier Service - Email classification and categorization
 """
+import hashlib
 import re
+from collections import OrderedDict
 from typing import Tuple
 
 from app.models.ticket import Category, Priority
 
 
+# Community name patterns, tried in order
+# e.g., comunidad.lasfuentes@gmail.com or presidencialomar@outlook.com
+COMMUNITY_PATTERNS = [
+    r'comunidad[.\s]*([\w\s]+)@',
+    r'presidente[.\s]*([\w\s]+)@', 
+    r'administ[.\s]*([\w\s]+)@',
+    r'comunidad de (propietarios )?(?:de )?([\w\s]+)',
+    r'urbanizaci[oó]n ([\w\s]+)',
+    r'residencial ([\w\s]+)',
+    r'edificio ([\w\s]+)',
+]
+
+# Max number of distinct texts whose classification results are kept
+CLASSIFIER_CACHE_SIZE = 1024
+
+
 class ClassifierService:
     """Service for classifying emails into categories and priorities"""
     
@@ -78,12 +96,8 @@ class ClassifierService:
         Classify an email based on subject and body content.
         Returns tuple of (Category, Priority)
         """
-        text = f"{subject} {body}".lower()
-        
-        category = self._detect_category(text)
-        priority = self._detect_priority(text, category)
-        
-        return category, priority
+        # Results are cached on the normalized text (bursts of identical mail)
+        return _classify_text(f"{subject} {body}".lower())
     
     def _detect_category(self, text: str) -> Category:
         """Detect the category based on keyword patterns"""
@@ -136,22 +150,11 @@ class ClassifierService:
     
     def extract_community_name(self, email_address: str, body: str) -> str | None:
         """Try to extract the community name from email or body"""
-        # Try common patterns for community emails
-        # e.g., comunidad.lasfuentes@gmail.com or presidencialomar@outlook.com
-        
-        patterns = [
-            r'comunidad[.\s]*([\w\s]+)@',
-            r'presidente[.\s]*([\w\s]+)@', 
-            r'administ[.\s]*([\w\s]+)@',
-            r'comunidad de (propietarios )?(?:de )?([\w\s]+)',
-            r'urbanizaci[oó]n ([\w\s]+)',
-            r'residencial ([\w\s]+)',
-            r'edificio ([\w\s]+)',
-        ]
-        
-        full_text = f"{email_address} {body}"
-        
-        for pattern in patterns:
+        return _extract_community(f"{email_address} {body}")
+    
+    def _extract_community_from_text(self, full_text: str) -> str | None:
+        """Match community name patterns against the combined email/body text"""
+        for pattern in COMMUNITY_PATTERNS:
             match = re.search(pattern, full_text, re.IGNORECASE)
             if match:
                 # Get the last captured group (the name)
@@ -159,3 +162,50 @@ class ClassifierService:
                 return name.strip().title()
         
         return None
+
+
+# Shared instance for the cached helpers (the classifier is stateless)
+_classifier = ClassifierService()
+
+
+# Results keyed by a digest of the normalized text, so the caches hold 16 bytes
+# per entry instead of keeping whole email bodies alive
+_classification_cache: "OrderedDict[bytes, Tuple[Category, Priority]]" = OrderedDict()
+_community_cache: "OrderedDict[bytes, str | None]" = OrderedDict()
+
+
+def _text_digest(text: str) -> bytes:
+    """Fixed-size cache key for a text"""
+    return hashlib.blake2b(text.encode(), digest_size=16).digest()
+
+
+def _remember(cache: OrderedDict, key: bytes, value) -> None:
+    """Store a result, evicting the least recently used one when full"""
+    cache[key] = value
+    if len(cache) > CLASSIFIER_CACHE_SIZE:
+        cache.popitem(last=False)
+
+
+def _classify_text(text: str) -> Tuple[Category, Priority]:
+    """Classify normalized text, memoized"""
+    key = _text_digest(text)
+    if key in _classification_cache:
+        _classification_cache.move_to_end(key)
+        return _classification_cache[key]
+    
+    category = _classifier._detect_category(text)
+    priority = _classifier._detect_priority(text, category)
+    _remember(_classification_cache, key, (category, priority))
+    return category, priority
+
+
+def _extract_community(full_text: str) -> str | None:
+    """Extract the community name from email/body text, memoized"""
+    key = _text_digest(full_text)
+    if key in _community_cache:
+        _community_cache.move_to_end(key)
+        return _community_cache[key]
+    
+    name = _classifier._extract_community_from_text(full_text)
+    _remember(_community_cache, key, name)
+    return name
@@ -2,23 +2,28 @@
 Email Service - IMAP/SMTP handling for email operations
 """
 import asyncio
-import email
 import json
 import logging
 import os
 import re
+import threading
+import time
 import uuid
 from datetime import datetime, timezone
 from email.header import decode_header
+from email.parser import BytesFeedParser
+from email.policy import SMTP as SMTP_POLICY, compat32
 from email.utils import parseaddr, parsedate_to_datetime
+from functools import lru_cache
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple
 
 import aiosmtplib
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+import httpx
+from email.message import EmailMessage
 from imapclient import IMAPClient
-from sqlalchemy import select
+from imapclient.exceptions import IMAPClientError
+from sqlalchemy import exists, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.config import get_settings
@@ -30,13 +35,271 @@ from app.models.provider import Provider
 from app.models.reporter import Reporter
 from app.models.ticket import Ticket, TicketStatus
 from app.schemas import TicketCreate
+from app.services.background import spawn_background
 from app.services.classifier_service import ClassifierService
 from app.services.ticket_service import TicketService
-from app.services.ai_agent_service import AIAgentService, IncidentAnalysis
+from app.services.ai_agent_service import MAX_STORED_HISTORY_MESSAGES, AIAgentService, IncidentAnalysis
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Precompiled patterns used on every processed email
+_TICKET_CODE_RE = re.compile(r'\[?(INC-[A-Z0-9]{6})\]?')
+_SAFE_FILENAME_RE = re.compile(r'[^\w\-_\.]')
+
+
+class _RateLimiter:
+    """Simple token-bucket limiter shared by all outbound API sends"""
+    
+    def __init__(self, rate: float):
+        self.rate = max(rate, 0.1)
+        self.tokens = self.rate
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self) -> None:
+        """Wait until a send token is available"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.rate, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# Global throttling for Resend/SendGrid API calls
+_send_semaphore = asyncio.Semaphore(settings.email_max_concurrency)
+_send_limiter = _RateLimiter(settings.email_rate_per_second)
+
+
+# Shared HTTP client for Resend/SendGrid so keep-alive connections are reused
+# across sends instead of paying a TLS handshake per email
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_http_client() -> httpx.AsyncClient:
+    """Get the shared HTTP client for email APIs"""
+    global _http_client
+    
+    if _http_client is None or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(max_keepalive_connections=20),
+        )
+    return _http_client
+
+
+async def _post_with_retry(url: str, headers: Dict[str, str], payload: dict):
+    """POST to an email API respecting rate limits, retrying on HTTP 429"""
+    attempts = max(settings.email_max_retries, 1)
+    # Encode once (compact separators) and reuse the bytes across retries
+    body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    client = _get_http_client()
+    async with _send_semaphore:
+        for attempt in range(attempts):
+            await _send_limiter.acquire()
+            response = await client.post(url, headers=headers, content=body)
+            if response.status_code != 429 or attempt == attempts - 1:
+                return response
+            
+            # Exponential backoff, honoring Retry-After when present
+            try:
+                delay = float(response.headers.get("Retry-After", ""))
+            except ValueError:
+                delay = 2 ** attempt
+            logger.warning("Rate limited by %s, retrying in %.1fs", url, delay)
+            await asyncio.sleep(min(delay, 30))
+
+
+# Persistent SMTP session shared across sends (avoids TLS + AUTH per email)
+_smtp_client: Optional[aiosmtplib.SMTP] = None
+_smtp_lock = asyncio.Lock()
+_smtp_last_used = 0.0
+
+# Idle time after which the SMTP connection is NOOP-probed before reuse
+SMTP_PROBE_AFTER_SECONDS = 60
+
+
+async def _get_smtp_client(username: str, password: str) -> aiosmtplib.SMTP:
+    """Get the shared SMTP connection, (re)connecting if needed"""
+    global _smtp_client
+    
+    if _smtp_client is not None and _smtp_client.is_connected:
+        # Servers silently drop idle sessions, probe before reusing an old one
+        if time.monotonic() - _smtp_last_used < SMTP_PROBE_AFTER_SECONDS:
+            return _smtp_client
+        try:
+            await _smtp_client.noop()
+            return _smtp_client
+        except aiosmtplib.SMTPException:
+            logger.info("Idle SMTP connection is no longer usable, reconnecting")
+            await close_smtp_client()
+    
+    # Port 465 uses direct TLS, port 587 uses STARTTLS
+    use_tls = settings.smtp_use_tls and settings.smtp_port == 465
+    start_tls = not use_tls and settings.smtp_port == 587
+    
+    client = aiosmtplib.SMTP(
+        hostname=settings.smtp_host,
+        port=settings.smtp_port,
+        use_tls=use_tls,
+        start_tls=start_tls,
+        timeout=settings.smtp_timeout,
+    )
+    await client.connect()
+    await client.login(username, password)
+    _smtp_client = client
+    return client
+
+
+async def close_http_client() -> None:
+    """Close the shared email API HTTP client"""
+    global _http_client
+    
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+async def close_smtp_client() -> None:
+    """Close the shared SMTP connection"""
+    global _smtp_client
+    
+    if _smtp_client is None:
+        return
+    try:
+        if _smtp_client.is_connected:
+            await _smtp_client.quit()
+    except Exception as e:
+        logger.debug("Error closing SMTP connection: %s", str(e))
+    _smtp_client = None
+
+
+# Maximum number of References entries used for thread matching
+MAX_REFERENCES = 20
+
+# Reconnect instead of probing when the IMAP session has been idle this long
+IMAP_MAX_IDLE_SECONDS = 1500
+
+# Granularity of IMAP IDLE waits, bounds how long shutdown waits for the worker
+IMAP_IDLE_CHECK_SECONDS = 1
+
+# How long shutdown waits for a running fetch/IDLE before leaving the session open
+IMAP_SHUTDOWN_WAIT_SECONDS = 3
+
+# Headers stripped before MIME parsing (lowercase name prefixes), and the
+# size above which any single header is dropped
+_DROPPED_HEADER_PREFIXES = (
+    b"dkim-signature", b"arc-", b"x-", b"authentication-results", b"received-spf",
+)
+MAX_HEADER_BYTES = 100 * 1024
+
+
+@lru_cache(maxsize=1)
+def _format_sender() -> str:
+    """Build the From header once (settings are immutable at runtime)"""
+    return f"{settings.from_name} <{settings.effective_from_email}>"
+
+
+async def _send_info_request_background(
+    ticket_id: int,
+    analysis: IncidentAnalysis,
+    reply_to_message_id: str,
+    known_data: Optional[dict],
+) -> None:
+    """Send an info request email using its own database session"""
+    try:
+        async with async_session_factory() as db:
+            ticket = await db.get(Ticket, ticket_id)
+            if not ticket:
+                logger.warning("Ticket %s not found for background info request", ticket_id)
+                return
+            await EmailService(db)._send_info_request(ticket, analysis, reply_to_message_id, known_data)
+    except Exception as e:
+        logger.error("Background info request failed for ticket %s: %s", ticket_id, str(e), exc_info=True)
+
+
+# Attachment directories already created by this process
+_created_dirs: set = set()
+
+
+async def _ensure_dir(path: Path) -> None:
+    """Create a directory once per process, off the event loop"""
+    if path not in _created_dirs:
+        await asyncio.to_thread(path.mkdir, parents=True, exist_ok=True)
+        _created_dirs.add(path)
+
+
+@lru_cache(maxsize=1)
+def _sendgrid_sender() -> Dict[str, str]:
+    """SendGrid "from" object, built once"""
+    return {"email": settings.effective_from_email, "name": settings.from_name}
+
+
+@lru_cache(maxsize=1)
+def _resend_headers() -> Dict[str, str]:
+    """Request headers for the Resend API, built once"""
+    return {
+        "Authorization": f"Bearer {settings.resend_api_key}",
+        "Content-Type": "application/json",
+    }
+
+
+@lru_cache(maxsize=1)
+def _sendgrid_headers() -> Dict[str, str]:
+    """Request headers for the SendGrid API, built once"""
+    return {
+        "Authorization": f"Bearer {settings.sendgrid_api_key}",
+        "Content-Type": "application/json",
+    }
+
+
+def _strip_unused_headers(raw_email: bytes) -> bytes:
+    """Drop bulky headers we never read (DKIM, ARC, X-*, ...) before parsing.
+    
+    Also drops any single header larger than MAX_HEADER_BYTES, which protects
+    the stdlib header parser from pathological inputs.
+    """
+    # Locate the end of the header block
+    for separator in (b"\r\n\r\n", b"\n\n"):
+        end = raw_email.find(separator)
+        if end != -1:
+            break
+    else:
+        return raw_email
+    
+    newline = separator[:len(separator) // 2]
+    kept = []
+    current = []
+    
+    def flush():
+        if current and sum(len(line) for line in current) <= MAX_HEADER_BYTES:
+            name = current[0].split(b":", 1)[0].strip().lower()
+            if not name.startswith(_DROPPED_HEADER_PREFIXES):
+                kept.extend(current)
+    
+    for line in raw_email[:end].split(newline):
+        if line[:1] in (b" ", b"\t") and current:
+            # Continuation of a folded header
+            current.append(line)
+        else:
+            flush()
+            current = [line]
+    flush()
+    
+    return newline.join(kept) + raw_email[end:]
+
+
+def _write_file(filepath: Path, content: bytes) -> None:
+    """Write raw bytes to disk atomically (runs in a worker thread)"""
+    tmp_path = filepath.with_name(f".{filepath.name}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, filepath)
+
 
 class EmailService:
     """Service for email operations"""
@@ -64,24 +327,31 @@ class EmailService:
         # Generate message ID
         message_id = f"<{uuid.uuid4()}@fincas-agent>"
         
+        # Resolve settings once (effective_* are computed properties)
+        provider = settings.email_provider
+        from_email = settings.effective_from_email
+        from_name = settings.from_name
+        use_sendgrid = provider == "sendgrid" and bool(settings.sendgrid_api_key)
+        use_resend = provider == "resend" and bool(settings.resend_api_key)
+        
         # Log configuration for debugging
-        logger.info("Preparing to send email: TO=%s, FROM=%s, PROVIDER=%s", 
-                   to, settings.effective_from_email, settings.email_provider)
-        logger.info("API Keys configured: RESEND=%s, SENDGRID=%s", 
-                   bool(settings.resend_api_key), bool(settings.sendgrid_api_key))
+        logger.debug("Preparing to send email: TO=%s, FROM=%s, PROVIDER=%s", 
+                    to, from_email, provider)
+        logger.debug("API Keys configured: RESEND=%s, SENDGRID=%s", 
+                    use_resend, use_sendgrid)
         
         # Choose provider
-        if settings.email_provider == "sendgrid" and settings.sendgrid_api_key:
+        if use_sendgrid:
             logger.info("Using SendGrid provider")
             await self._send_via_sendgrid(to, subject, body_text, body_html, cc, in_reply_to, references)
-        elif settings.email_provider == "resend" and settings.resend_api_key:
+        elif use_resend:
             logger.info("Using Resend provider")
             await self._send_via_resend(to, subject, body_text, body_html, cc, in_reply_to, references)
         else:
             logger.info("Using SMTP provider (fallback)")
             await self._send_via_smtp(to, subject, body_text, body_html, cc, message_id, in_reply_to, references)
         
-        logger.info("Email sent successfully to %s via %s from %s", to, settings.email_provider, settings.effective_from_email)
+        logger.info("Email sent successfully to %s via %s from %s", to, provider, from_email)
         
         # Store outbound email if ticket provided
         if ticket:
@@ -91,8 +361,8 @@ class EmailService:
                 subject=subject,
                 body_text=body_text,
                 body_html=body_html,
-                from_address=settings.effective_from_email,
-                from_name=settings.from_name,
+                from_address=from_email,
+                from_name=from_name,
                 to_address=to,
                 cc_addresses=", ".join(cc) if cc else None,
                 direction=EmailDirection.OUTBOUND,
@@ -102,7 +372,6 @@ class EmailService:
             )
             self.db.add(email_record)
             await self.db.commit()
-            await self.db.refresh(email_record)
             return email_record
         
         return None
@@ -118,13 +387,11 @@ class EmailService:
         references: Optional[str],
     ) -> None:
         """Send email via Resend API (HTTP-based, no port blocking issues)"""
-        import httpx
-        
         logger.info("Sending email to %s via Resend API", to)
         
         # Build email payload
         payload = {
-            "from": f"{settings.from_name} <{settings.effective_from_email}>",
+            "from": _format_sender(),
             "to": [to],
             "subject": subject,
             "text": body_text,
@@ -145,24 +412,19 @@ class EmailService:
         if headers_dict:
             payload["headers"] = headers_dict
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.resend.com/emails",
-                headers={
-                    "Authorization": f"Bearer {settings.resend_api_key}",
-                    "Content-Type": "application/json",
-                },
-                json=payload,
-                timeout=30.0,
-            )
-            
-            if response.status_code not in (200, 201):
-                error_detail = response.text
-                logger.error("Resend API error: %s - %s", response.status_code, error_detail)
-                raise Exception(f"Resend API error: {response.status_code} - {error_detail}")
-            
-            result = response.json()
-            logger.info("Email sent via Resend, ID: %s", result.get("id"))
+        response = await _post_with_retry(
+            "https://api.resend.com/emails",
+            headers=_resend_headers(),
+            payload=payload,
+        )
+        
+        if response.status_code not in (200, 201):
+            error_detail = response.text
+            logger.error("Resend API error: %s - %s", response.status_code, error_detail)
+            raise Exception(f"Resend API error: {response.status_code} - {error_detail}")
+        
+        result = response.json()
+        logger.info("Email sent via Resend, ID: %s", result.get("id"))
     
     async def _send_via_sendgrid(
         self,
@@ -175,8 +437,6 @@ class EmailService:
         references: Optional[str],
     ) -> None:
         """Send email via SendGrid API (HTTP-based, no port blocking issues)"""
-        import httpx
-        
         logger.info("Sending email to %s via SendGrid API", to)
         
         # Build email payload for SendGrid v3 API
@@ -189,10 +449,7 @@ class EmailService:
         
         payload = {
             "personalizations": [personalizations],
-            "from": {
-                "email": settings.effective_from_email,
-                "name": settings.from_name,
-            },
+            "from": _sendgrid_sender(),
             "subject": subject,
             "content": [
                 {"type": "text/plain", "value": body_text},
@@ -210,24 +467,19 @@ class EmailService:
             if references:
                 payload["headers"]["References"] = references
         
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                "https://api.sendgrid.com/v3/mail/send",
-                headers={
-                    "Authorization": f"Bearer {settings.sendgrid_api_key}",
-                    "Content-Type": "application/json",
-                },
-                json=payload,
-                timeout=30.0,
-            )
-            
-            # SendGrid returns 202 Accepted on success
-            if response.status_code not in (200, 201, 202):
-                error_detail = response.text
-                logger.error("SendGrid API error: %s - %s", response.status_code, error_detail)
-                raise Exception(f"SendGrid API error: {response.status_code} - {error_detail}")
-            
-            logger.info("Email sent via SendGrid successfully")
+        response = await _post_with_retry(
+            "https://api.sendgrid.com/v3/mail/send",
+            headers=_sendgrid_headers(),
+            payload=payload,
+        )
+        
+        # SendGrid returns 202 Accepted on success
+        if response.status_code not in (200, 201, 202):
+            error_detail = response.text
+            logger.error("SendGrid API error: %s - %s", response.status_code, error_detail)
+            raise Exception(f"SendGrid API error: {response.status_code} - {error_detail}")
+        
+        logger.info("Email sent via SendGrid successfully")
     
     async def _send_via_smtp(
         self,
@@ -241,9 +493,9 @@ class EmailService:
         references: Optional[str],
     ) -> None:
         """Send email via SMTP"""
-        msg = MIMEMultipart("alternative")
+        msg = EmailMessage(policy=SMTP_POLICY)
         msg["Subject"] = subject
-        msg["From"] = f"{settings.from_name} <{settings.effective_from_email}>"
+        msg["From"] = _format_sender()
         msg["To"] = to
         
         if cc:
@@ -257,11 +509,11 @@ class EmailService:
             msg["References"] = references
         
         # Add text body
-        msg.attach(MIMEText(body_text, "plain", "utf-8"))
+        msg.set_content(body_text, charset="utf-8")
         
-        # Add HTML body if provided
+        # Add HTML body if provided (becomes multipart/alternative)
         if body_html:
-            msg.attach(MIMEText(body_html, "html", "utf-8"))
+            msg.add_alternative(body_html, subtype="html", charset="utf-8")
         
         # Check SMTP credentials
         smtp_user = settings.effective_smtp_user
@@ -273,20 +525,23 @@ class EmailService:
         
         logger.info("Sending email to %s via %s:%d (TLS=%s)", to, settings.smtp_host, settings.smtp_port, settings.smtp_use_tls)
         
-        # Port 465 uses direct TLS, port 587 uses STARTTLS
-        use_tls = settings.smtp_use_tls and settings.smtp_port == 465
-        start_tls = not use_tls and settings.smtp_port == 587
-        
-        await aiosmtplib.send(
-            msg,
-            hostname=settings.smtp_host,
-            port=settings.smtp_port,
-            username=smtp_user,
-            password=smtp_password,
-            use_tls=use_tls,
-            start_tls=start_tls,
-            timeout=settings.smtp_timeout,
-        )
+        # Reuse the persistent SMTP session; SMTP is sequential so sends are serialized
+        global _smtp_last_used
+        async with _smtp_lock:
+            try:
+                smtp = await _get_smtp_client(smtp_user, smtp_password)
+                await smtp.send_message(msg)
+            except aiosmtplib.SMTPServerDisconnected:
+                # Server closed an idle connection - reconnect once and retry
+                logger.info("SMTP connection was closed by server, reconnecting")
+                await close_smtp_client()
+                smtp = await _get_smtp_client(smtp_user, smtp_password)
+                await smtp.send_message(msg)
+            except Exception:
+                # Don't reuse a connection left in an unknown state
+                await close_smtp_client()
+                raise
+            _smtp_last_used = time.monotonic()
     
     async def process_inbound_email(
         self,
@@ -314,12 +569,12 @@ class EmailService:
             email_record = await self._store_email(
                 ticket, message_id, subject, body_text, body_html,
                 from_address, from_name, to_address, cc_addresses,
-                received_at, in_reply_to, references, EmailDirection.INBOUND
+                received_at, in_reply_to, references, EmailDirection.INBOUND,
+                commit=False,
             )
             
-            # Save attachments
-            if attachments_data:
-                await self._save_attachments(email_record, attachments_data, ticket.ticket_code)
+            # Save attachments (commits the email and attachments together)
+            await self._save_attachments(email_record, attachments_data, ticket.ticket_code)
             
             # If ticket is in NEEDS_INFO status, process with AI to check if info is now complete
             if ticket.status == TicketStatus.NEEDS_INFO:
@@ -350,8 +605,12 @@ class EmailService:
                    analysis.has_complete_info, analysis.category, analysis.missing_fields)
         
         # Create ticket with AI-determined category/priority or fallback
-        category = analysis.category or self.classifier.classify_email(subject, body_text or "")[0]
-        priority = analysis.priority or self.classifier.classify_email(subject, body_text or "")[1]
+        if analysis.category and analysis.priority:
+            category, priority = analysis.category, analysis.priority
+        else:
+            fallback_category, fallback_priority = self.classifier.classify_email(subject, body_text or "")
+            category = analysis.category or fallback_category
+            priority = analysis.priority or fallback_priority
         community = self.classifier.extract_community_name(from_address, body_text or "")
         
         # Pre-fill from known reporter data (intelligent matching)
@@ -387,54 +646,47 @@ class EmailService:
             ],
         }
         
-        # Create ticket with pre-filled reporter data
-        ticket_service = TicketService(self.db)
-        ticket = await ticket_service.create_ticket(TicketCreate(
-            subject=subject,
-            description=body_text[:2000] if body_text else None,
-            category=category,
-            priority=priority,
-            reporter_email=from_address,
-            reporter_name=reporter_name_to_use,
-            reporter_phone=reporter_phone_to_use,
-            community_name=community_to_use,
-            address=address_to_use,
-            location_detail=floor_door_to_use,
-        ))
-        
-        # Update ticket with AI context and status
-        ticket.status = initial_status
-        ticket.ai_context = ai_context
-        
-        # Update extracted location info if available (override pre-filled with fresh data)
+        # Extracted location info overrides pre-filled data (fresher)
         extracted = analysis.extracted_info
-        if extracted.get("address"):
-            ticket.address = extracted["address"]
-        if extracted.get("location_detail"):
-            ticket.location_detail = extracted["location_detail"]
-        if extracted.get("reporter_phone"):
-            ticket.reporter_phone = extracted["reporter_phone"]
-        if extracted.get("reporter_name") and not ticket.reporter_name:
-            ticket.reporter_name = extracted["reporter_name"]
+        address_to_use = extracted.get("address") or address_to_use
+        floor_door_to_use = extracted.get("location_detail") or floor_door_to_use
+        reporter_phone_to_use = extracted.get("reporter_phone") or reporter_phone_to_use
+        reporter_name_to_use = reporter_name_to_use or extracted.get("reporter_name")
+        
+        # Create ticket with pre-filled reporter data, status and AI context in one insert
+        ticket_service = TicketService(self.db)
+        ticket = await ticket_service.create_ticket(
+            TicketCreate(
+                subject=subject,
+                description=body_text[:2000] if body_text else None,
+                category=category,
+                priority=priority,
+                reporter_email=from_address,
+                reporter_name=reporter_name_to_use,
+                reporter_phone=reporter_phone_to_use,
+                community_name=community_to_use,
+                address=address_to_use,
+                location_detail=floor_door_to_use,
+            ),
+            status=initial_status,
+            ai_context=ai_context,
+        )
         
         # Update reporter with any new information extracted from this ticket
         await self._update_reporter_from_ticket(reporter, ticket, extracted)
         
-        await self.db.commit()
-        await self.db.refresh(ticket)
-        
         logger.info("Created ticket %s with status %s", ticket.ticket_code, initial_status.value)
         
         # Store the email
         email_record = await self._store_email(
             ticket, message_id, subject, body_text, body_html,
             from_address, from_name, to_address, cc_addresses,
-            received_at, in_reply_to, references, EmailDirection.INBOUND
+            received_at, in_reply_to, references, EmailDirection.INBOUND,
+            commit=False,
         )
         
-        # Save attachments
-        if attachments_data:
-            await self._save_attachments(email_record, attachments_data, ticket.ticket_code)
+        # Save attachments (commits the email and attachments together)
+        await self._save_attachments(email_record, attachments_data, ticket.ticket_code)
         
         # If info is complete, notify the default provider for this category
         if analysis.has_complete_info:
@@ -459,7 +711,10 @@ class EmailService:
                         "address": reporter.address,
                         "floor_door": reporter.floor_door,
                     }
-                await self._send_info_request(ticket, analysis, email_record.message_id, known_data)
+                # Send in the background so ingestion can move on to the next email
+                spawn_background(_send_info_request_background(
+                    ticket.id, analysis, email_record.message_id, known_data
+                ))
             else:
                 logger.warning("Ticket %s marked incomplete but no questions/fields to ask", ticket.ticket_code)
         
@@ -481,23 +736,24 @@ class EmailService:
         email_lower = email.lower().strip()
         
         # Check if this email belongs to a provider - don't create reporter in that case
-        provider_check = await self.db.execute(
-            select(Provider).where(Provider.email == email_lower)
+        is_provider = await self.db.scalar(
+            select(exists().where(Provider.email == email_lower))
         )
-        if provider_check.scalar_one_or_none():
+        if is_provider:
             logger.info("Email %s belongs to a provider, skipping reporter creation", email_lower)
             return None
         
-        # Try to find existing reporter
+        # Try to find existing reporter (populate_existing reloads a cached
+        # instance with the latest data in the same round-trip)
         result = await self.db.execute(
-            select(Reporter).where(Reporter.email == email_lower)
+            select(Reporter)
+            .where(Reporter.email == email_lower)
+            .execution_options(populate_existing=True)
         )
         reporter = result.scalar_one_or_none()
         
         if reporter:
-            # Refresh to ensure we have latest data from database
-            await self.db.refresh(reporter)
-            logger.info("Found existing reporter: %s (%s) (refreshed)", reporter.name, reporter.email)
+            logger.info("Found existing reporter: %s (%s)", reporter.name, reporter.email)
             return reporter
         
         # Create new reporter with minimal info
@@ -508,7 +764,6 @@ class EmailService:
         )
         self.db.add(reporter)
         await self.db.commit()
-        await self.db.refresh(reporter)
         
         logger.info("Created new reporter: %s (%s)", reporter.name, reporter.email)
         return reporter
@@ -525,6 +780,7 @@ class EmailService:
         from their incident reports.
         
         Does nothing if reporter is None (e.g., email belongs to a provider).
+        Changes are left pending in the session for the caller to commit.
         """
         if reporter is None:
             return
@@ -561,7 +817,7 @@ class EmailService:
             updated = True
         
         if updated:
-            await self.db.commit()
+            # Committed together with the inbound email and its attachments
             logger.info("Updated reporter %s with new information", reporter.email)
     
     async def _store_email(
@@ -579,8 +835,13 @@ class EmailService:
         in_reply_to: Optional[str],
         references: Optional[str],
         direction: EmailDirection,
+        commit: bool = True,
     ) -> Email:
-        """Store email record in database"""
+        """Store email record in database.
+        
+        With commit=False the row is only flushed (to obtain its id) so it can be
+        committed together with its attachments.
+        """
         email_record = Email(
             ticket_id=ticket.id,
             message_id=message_id,
@@ -597,8 +858,10 @@ class EmailService:
             received_at=received_at,
         )
         self.db.add(email_record)
-        await self.db.commit()
-        await self.db.refresh(email_record)
+        if commit:
+            await self.db.commit()
+        else:
+            await self.db.flush()
         return email_record
     
     async def _send_info_request(
@@ -610,9 +873,10 @@ class EmailService:
     ) -> None:
         """Send email requesting missing information, showing known data for confirmation"""
         logger.info("Preparing info request email for ticket %s", ticket.ticket_code)
-        logger.info("Missing fields: %s", analysis.missing_fields)
-        logger.info("Follow-up questions: %s", analysis.follow_up_questions)
-        logger.info("Known data: %s", known_data)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Missing fields: %s", analysis.missing_fields)
+            logger.debug("Follow-up questions: %s", analysis.follow_up_questions)
+            logger.debug("Known data: %s", known_data)
         
         try:
             # Generate follow-up email content with known data
@@ -679,14 +943,7 @@ class EmailService:
         """
         try:
             # Find the default provider for this category
-            result = await self.db.execute(
-                select(Provider).where(
-                    (Provider.category == ticket.category) &
-                    (Provider.is_default == True) &  # noqa: E712
-                    (Provider.is_active == True)  # noqa: E712
-                )
-            )
-            provider = result.scalar_one_or_none()
+            provider = await TicketService(self.db).get_default_provider_for_category(ticket.category)
             
             if not provider:
                 logger.info("No default provider found for category %s, skipping notification", ticket.category.value)
@@ -821,8 +1078,9 @@ Sistema de Gestión de Incidencias
                 summary=prev_analysis_data.get("summary", ""),
             )
             
-            # Add new message to conversation history
+            # Add new message to conversation history (oldest turns dropped)
             conversation_history.append({"role": "user", "content": new_message})
+            del conversation_history[:-MAX_STORED_HISTORY_MESSAGES]
             
             # Process with AI
             updated_analysis = await self.ai_agent.process_follow_up_response(
@@ -886,11 +1144,12 @@ Sistema de Gestión de Incidencias
                 known_data = None
                 if ticket.reporter_email:
                     reporter_result = await self.db.execute(
-                        select(Reporter).where(Reporter.email == ticket.reporter_email.lower())
+                        select(Reporter)
+                        .where(Reporter.email == ticket.reporter_email.lower())
+                        .execution_options(populate_existing=True)
                     )
                     reporter = reporter_result.scalar_one_or_none()
                     if reporter:
-                        await self.db.refresh(reporter)
                         known_data = {
                             "name": reporter.name if reporter.name and not reporter.name.startswith(reporter.email.split('@')[0]) else None,
                             "phone": reporter.phone,
@@ -925,7 +1184,7 @@ Sistema de Gestión de Incidencias
         
         # First priority: Check for ticket code in subject (most reliable)
         # e.g., "Re: [INC-ABC123] Your issue" or just "INC-ABC123"
-        ticket_code_match = re.search(r'\[?(INC-[A-Z0-9]{6})\]?', subject)
+        ticket_code_match = _TICKET_CODE_RE.search(subject)
         if ticket_code_match:
             ticket_code = ticket_code_match.group(1)
             logger.info("Found ticket code %s in subject", ticket_code)
@@ -942,67 +1201,63 @@ Sistema de Gestión de Incidencias
                     logger.info("Ticket %s is CLOSED, will create new ticket", ticket_code)
                     return None
         
+        # Collect threading candidates (In-Reply-To first, then References)
+        ref_ids = []
+        if references:
+            # Skip our own system-generated message IDs and only keep the most
+            # recent references (rightmost) so long threads stay a small IN list
+            ref_ids = list(dict.fromkeys(
+                ref.strip() for ref in references.split()[-MAX_REFERENCES:]
+                if ref.strip() and "@fincas-agent>" not in ref
+            ))
+        candidate_ids = list(dict.fromkeys(([in_reply_to] if in_reply_to else []) + ref_ids))
+        
+        # Resolve all candidates to their tickets in a single query
+        tickets_by_message_id = {}
+        if candidate_ids:
+            result = await self.db.execute(
+                select(Email.message_id, Ticket)
+                .join(Ticket, Email.ticket_id == Ticket.id)
+                .where(Email.message_id.in_(candidate_ids))
+            )
+            tickets_by_message_id = {row[0]: row[1] for row in result.all()}
+        
         # Second priority: Check by In-Reply-To header
         if in_reply_to:
             logger.debug("Checking In-Reply-To: %s", in_reply_to)
-            result = await self.db.execute(
-                select(Email).where(Email.message_id == in_reply_to)
-            )
-            original_email = result.scalar_one_or_none()
-            if original_email:
-                ticket_result = await self.db.execute(
-                    select(Ticket).where(Ticket.id == original_email.ticket_id)
-                )
-                ticket = ticket_result.scalar_one_or_none()
-                if ticket:
-                    # Only use if not closed and recent
-                    age = datetime.utcnow() - ticket.created_at.replace(tzinfo=None)
-                    if ticket.status == TicketStatus.CLOSED:
-                        logger.info("Ticket %s is CLOSED, creating new ticket", ticket.ticket_code)
-                        return None
-                    elif age > timedelta(days=30):
-                        logger.info("Ticket %s is too old (%d days), creating new ticket", 
-                                   ticket.ticket_code, age.days)
-                        return None
-                    else:
-                        logger.info("Associating email with ticket %s (found by In-Reply-To)", 
-                                   ticket.ticket_code)
-                        return ticket
+            ticket = tickets_by_message_id.get(in_reply_to)
+            if ticket:
+                # Only use if not closed and recent
+                age = datetime.utcnow() - ticket.created_at.replace(tzinfo=None)
+                if ticket.status == TicketStatus.CLOSED:
+                    logger.info("Ticket %s is CLOSED, creating new ticket", ticket.ticket_code)
+                    return None
+                elif age > timedelta(days=30):
+                    logger.info("Ticket %s is too old (%d days), creating new ticket", 
+                               ticket.ticket_code, age.days)
+                    return None
+                else:
+                    logger.info("Associating email with ticket %s (found by In-Reply-To)", 
+                               ticket.ticket_code)
+                    return ticket
         
         # Third priority: Check references header
-        if references:
-            for ref in references.split():
-                ref = ref.strip()
-                if not ref:
+        for ref in ref_ids:
+            ticket = tickets_by_message_id.get(ref)
+            if ticket:
+                age = datetime.utcnow() - ticket.created_at.replace(tzinfo=None)
+                if ticket.status == TicketStatus.CLOSED:
+                    logger.info("Ticket %s (from References) is CLOSED, skipping", 
+                               ticket.ticket_code)
                     continue
-                    
-                # Skip our own system-generated message IDs
-                if "@fincas-agent>" in ref:
+                elif age > timedelta(days=30):
+                    logger.info("Ticket %s (from References) is too old, skipping", 
+                               ticket.ticket_code)
                     continue
-                    
-                result = await self.db.execute(
-                    select(Email).where(Email.message_id == ref)
-                )
-                ref_email = result.scalar_one_or_none()
-                if ref_email:
-                    ticket_result = await self.db.execute(
-                        select(Ticket).where(Ticket.id == ref_email.ticket_id)
-                    )
-                    ticket = ticket_result.scalar_one_or_none()
-                    if ticket:
-                        age = datetime.utcnow() - ticket.created_at.replace(tzinfo=None)
-                        if ticket.status == TicketStatus.CLOSED:
-                            logger.info("Ticket %s (from References) is CLOSED, skipping", 
-                                       ticket.ticket_code)
-                            continue
-                        elif age > timedelta(days=30):
-                            logger.info("Ticket %s (from References) is too old, skipping", 
-                                       ticket.ticket_code)
-                            continue
-                        else:
-                            logger.info("Associating email with ticket %s (found by References)", 
-                                       ticket.ticket_code)
-                            return ticket
+                else:
+                    logger.info("Associating email with ticket %s (found by References)", 
+                               ticket.ticket_code)
+                    return ticket
         
         logger.info("No existing ticket found for email from %s, will create new", from_address)
         return None
@@ -1013,33 +1268,40 @@ Sistema de Gestión de Incidencias
         attachments_data: List[Tuple[str, bytes, str]],
         ticket_code: str,
     ) -> List[Attachment]:
-        """Save email attachments to disk and database"""
-        saved = []
+        """Save email attachments to disk and database, committing the session"""
+        if not attachments_data:
+            await self.db.commit()
+            return []
         
         # Create directory for ticket attachments
         ticket_dir = Path(settings.attachments_path) / ticket_code
-        ticket_dir.mkdir(parents=True, exist_ok=True)
+        await _ensure_dir(ticket_dir)
         
+        # Generate unique filenames up front
+        pending = []
         for filename, content, content_type in attachments_data:
-            # Generate unique filename
-            safe_filename = re.sub(r'[^\w\-_\.]', '_', filename)
+            safe_filename = _SAFE_FILENAME_RE.sub('_', filename)
             unique_filename = f"{uuid.uuid4().hex[:8]}_{safe_filename}"
-            filepath = ticket_dir / unique_filename
-            
-            # Write file
-            with open(filepath, 'wb') as f:
-                f.write(content)
-            
-            # Create database record
-            attachment = Attachment(
+            pending.append((filename, ticket_dir / unique_filename, content, content_type))
+        
+        # Write files in worker threads so the event loop is not blocked
+        await asyncio.gather(*[
+            asyncio.to_thread(_write_file, filepath, content)
+            for _, filepath, content, _ in pending
+        ])
+        
+        # Create database records in a single batch
+        saved = [
+            Attachment(
                 email_id=email_record.id,
                 filename=filename,
                 filepath=str(filepath),
                 content_type=content_type,
                 size_bytes=len(content),
             )
-            self.db.add(attachment)
-            saved.append(attachment)
+            for filename, filepath, content, content_type in pending
+        ]
+        self.db.add_all(saved)
         
         await self.db.commit()
         return saved
@@ -1053,6 +1315,12 @@ class IMAPPoller:
         self.port = settings.imap_port
         self.user = settings.imap_user
         self.password = settings.imap_password
+        self.system_email = settings.effective_from_email.lower()
+        self._client: Optional[IMAPClient] = None
+        self._last_used = 0.0
+        # Fetches and IDLE run in executor threads; this keeps a LOGOUT from
+        # being sent while another command is still in progress
+        self._lock = threading.Lock()
     
     def connect(self) -> IMAPClient:
         """Create IMAP connection"""
@@ -1060,41 +1328,161 @@ class IMAPPoller:
         client.login(self.user, self.password)
         return client
     
+    def _ensure_connection(self) -> IMAPClient:
+        """Reuse the cached IMAP connection, reconnecting if stale or dead"""
+        if self._client is not None:
+            if time.monotonic() - self._last_used > IMAP_MAX_IDLE_SECONDS:
+                # Servers drop idle sessions (~30 min), don't bother probing
+                self.close()
+            else:
+                try:
+                    self._client.noop()
+                except Exception:
+                    logger.info("Cached IMAP connection is dead, reconnecting")
+                    self.close()
+        
+        if self._client is None:
+            self._client = self.connect()
+        return self._client
+    
+    def close(self) -> None:
+        """Log out and drop the cached IMAP connection"""
+        if self._client is None:
+            return
+        try:
+            self._client.logout()
+        except Exception as e:
+            logger.debug("Error closing IMAP connection: %s", str(e))
+        self._client = None
+    
+    def shutdown(self) -> None:
+        """Log out once no fetch or IDLE is using the connection"""
+        # IDLE notices the stop flag within IMAP_IDLE_CHECK_SECONDS
+        if not self._lock.acquire(timeout=IMAP_SHUTDOWN_WAIT_SECONDS):
+            logger.warning("IMAP connection still busy at shutdown, not logging out")
+            return
+        try:
+            self.close()
+        finally:
+            self._lock.release()
+    
     def fetch_unread_emails(self) -> List[dict]:
         """Fetch all unread emails from inbox"""
+        with self._lock:
+            return self._fetch_unread_emails()
+    
+    def _fetch_unread_emails(self) -> List[dict]:
+        """Search, fetch, parse and flag unread messages (caller holds the lock)"""
         emails = []
         
         try:
-            client = self.connect()
+            client = self._ensure_connection()
             client.select_folder("INBOX")
             
-            # Search for unread messages
-            messages = client.search(["UNSEEN"])
+            # Search for unread messages, letting the server drop our own
+            # outbound mail so it is never downloaded
+            messages = client.search(self._search_criteria())
             
             if messages:
                 logger.info("Found %d unread messages", len(messages))
                 
-                for uid, message_data in client.fetch(messages, ["RFC822"]).items():
-                    raw_email = message_data[b"RFC822"]
-                    parsed = self._parse_email(raw_email)
-                    if parsed:
-                        parsed["uid"] = uid
-                        emails.append(parsed)
-                        
-                        # Mark as seen
-                        client.add_flags([uid], ["\\Seen"])
+                # One timestamp for the whole batch, used when Date is missing/invalid
+                now = datetime.now(timezone.utc)
+                
+                # Fetch in batches to keep the request size bounded; PEEK avoids
+                # an implicit \Seen until we know how the message was handled
+                seen_uids = []
+                for batch in self._uid_batches(messages):
+                    raw_by_uid = client.fetch(batch, ["BODY.PEEK[]"])
+                    # Drop each raw message as soon as it is parsed, so only
+                    # one batch of raw bytes is held at a time
+                    for uid in list(raw_by_uid):
+                        parsed = self._parse_email(raw_by_uid.pop(uid)[b"BODY[]"], now)
+                        if parsed:
+                            parsed["uid"] = uid
+                            emails.append(parsed)
+                        else:
+                            # Unparseable messages are flagged too, otherwise they
+                            # would be downloaded and parsed again on every poll
+                            logger.warning("Could not parse message UID %s, marking it as seen", uid)
+                        seen_uids.append(uid)
+                
+                # Mark all fetched messages as seen in a single command
+                if seen_uids:
+                    client.add_flags(seen_uids, ["\\Seen"])
             
-            client.logout()
+            self._last_used = time.monotonic()
             
         except Exception as e:
             logger.error("Error fetching emails: %s", str(e))
+            # Don't reuse a connection in an unknown state
+            self.close()
         
         return emails
     
-    def _parse_email(self, raw_email: bytes) -> Optional[dict]:
+    def wait_for_new_mail(self, timeout: float, should_stop: Callable[[], bool]) -> Optional[bool]:
+        """Block in IMAP IDLE until new mail arrives (True), timeout/stop (False).
+        
+        Returns None when the server does not support IDLE.
+        """
+        with self._lock:
+            return self._wait_for_new_mail(timeout, should_stop)
+    
+    def _wait_for_new_mail(self, timeout: float, should_stop: Callable[[], bool]) -> Optional[bool]:
+        """IDLE loop behind wait_for_new_mail (caller holds the lock)"""
+        client = self._ensure_connection()
+        if not client.has_capability("IDLE"):
+            return None
+        client.select_folder("INBOX")
+        try:
+            client.idle()
+        except IMAPClientError as e:
+            logger.info("IMAP server rejected IDLE: %s", str(e))
+            return None
+        
+        new_mail = False
+        try:
+            deadline = time.monotonic() + timeout
+            while not new_mail and not should_stop():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                responses = client.idle_check(timeout=min(remaining, IMAP_IDLE_CHECK_SECONDS))
+                new_mail = any(
+                    len(response) > 1 and response[1] == b"EXISTS" for response in responses
+                )
+            client.idle_done()
+        except Exception:
+            # Don't reuse a connection in an unknown state
+            self.close()
+            raise
+        self._last_used = time.monotonic()
+        return new_mail
+    
+    @staticmethod
+    def _uid_batches(uids: List[int]) -> List[List[int]]:
+        """Split UIDs into FETCH-sized batches"""
+        batch_size = max(settings.imap_fetch_batch_size, 1)
+        return [uids[i:i + batch_size] for i in range(0, len(uids), batch_size)]
+    
+    def _search_criteria(self) -> List[str]:
+        """UNSEEN search excluding emails sent by this system (prevents loops).
+        
+        IMAP FROM matches substrings, so this is only a prefilter; process_emails
+        still compares the parsed sender exactly.
+        """
+        criteria = ["UNSEEN"]
+        if self.system_email:
+            criteria += ["NOT", "FROM", self.system_email]
+        criteria += ["NOT", "HEADER", "Message-ID", "@fincas-agent"]
+        return criteria
+    
+    def _parse_email(self, raw_email: bytes, now: Optional[datetime] = None) -> Optional[dict]:
         """Parse a raw email into a structured dict"""
         try:
-            msg = email.message_from_bytes(raw_email)
+            parser = BytesFeedParser(policy=compat32)
+            parser.feed(_strip_unused_headers(raw_email))
+            msg = parser.close()
             
             # Decode subject
             subject = self._decode_header(msg.get("Subject", ""))
@@ -1118,10 +1506,11 @@ class IMAPPoller:
             
             # Get date
             date_str = msg.get("Date")
+            fallback_received_at = now or datetime.now(timezone.utc)
             try:
-                received_at = parsedate_to_datetime(date_str) if date_str else datetime.now(timezone.utc)
+                received_at = parsedate_to_datetime(date_str) if date_str else fallback_received_at
             except Exception:
-                received_at = datetime.now(timezone.utc)
+                received_at = fallback_received_at
             
             # Extract body and attachments
             body_text = None
@@ -1130,10 +1519,14 @@ class IMAPPoller:
             
             if msg.is_multipart():
                 for part in msg.walk():
+                    # Containers carry no payload of their own
+                    if part.is_multipart():
+                        continue
+                    
                     content_type = part.get_content_type()
-                    content_disposition = str(part.get("Content-Disposition", ""))
+                    is_attachment = part.get_content_disposition() == "attachment"
                     
-                    if "attachment" in content_disposition:
+                    if is_attachment:
                         # It's an attachment
                         filename = part.get_filename()
                         if filename:
@@ -1144,19 +1537,19 @@ class IMAPPoller:
                     elif content_type == "text/plain" and not body_text:
                         payload = part.get_payload(decode=True)
                         if payload:
-                            body_text = payload.decode("utf-8", errors="replace")
+                            body_text = self._decode_payload(part, payload)
                     elif content_type == "text/html" and not body_html:
                         payload = part.get_payload(decode=True)
                         if payload:
-                            body_html = payload.decode("utf-8", errors="replace")
+                            body_html = self._decode_payload(part, payload)
             else:
                 # Not multipart
                 payload = msg.get_payload(decode=True)
                 if payload:
                     if msg.get_content_type() == "text/html":
-                        body_html = payload.decode("utf-8", errors="replace")
+                        body_html = self._decode_payload(msg, payload)
                     else:
-                        body_text = payload.decode("utf-8", errors="replace")
+                        body_text = self._decode_payload(msg, payload)
             
             return {
                 "message_id": message_id,
@@ -1177,6 +1570,15 @@ class IMAPPoller:
             logger.error("Error parsing email: %s", str(e))
             return None
     
+    def _decode_payload(self, part, payload: bytes) -> str:
+        """Decode a text part once using its declared charset (UTF-8 fallback)"""
+        charset = part.get_content_charset() or "utf-8"
+        try:
+            return payload.decode(charset, errors="replace")
+        except LookupError:
+            # Unknown charset name in the header
+            return payload.decode("utf-8", errors="replace")
+    
     def _decode_header(self, header: str) -> str:
         """Decode an email header properly"""
         if not header:
@@ -1192,11 +1594,38 @@ class IMAPPoller:
         return "".join(decoded_parts)
 
 
+# Poller shared across polling cycles so the IMAP session is reused
+_poller: Optional[IMAPPoller] = None
+
+
+async def wait_for_new_emails(timeout: float, should_stop: Callable[[], bool]) -> Optional[bool]:
+    """Wait for new mail via IMAP IDLE on the shared connection (None if unsupported)"""
+    global _poller
+    
+    if _poller is None:
+        _poller = IMAPPoller()
+    return await asyncio.get_event_loop().run_in_executor(
+        None, _poller.wait_for_new_mail, timeout, should_stop
+    )
+
+
+async def close_imap_poller() -> None:
+    """Log out the shared IMAP connection once any fetch or IDLE has finished"""
+    global _poller
+    
+    if _poller is not None:
+        await asyncio.get_event_loop().run_in_executor(None, _poller.shutdown)
+        _poller = None
+
+
 async def process_emails():
     """Process all unread emails from IMAP"""
-    poller = IMAPPoller()
+    global _poller
+    
+    if _poller is None:
+        _poller = IMAPPoller()
     emails = await asyncio.get_event_loop().run_in_executor(
-        None, poller.fetch_unread_emails
+        None, _poller.fetch_unread_emails
     )
     
     if not emails:
@@ -1204,56 +1633,74 @@ async def process_emails():
     
     # Get the system's own email address to filter out self-sent emails
     system_email = settings.effective_from_email.lower()
-    logger.info("Processing %d emails. System email (for self-filter): %s, Provider: %s", 
+    logger.info("Processing %d emails. System email (for self-filter): %s, Provider: %s",
                len(emails), system_email, settings.email_provider)
     
+    # Find already-processed emails with a single query
+    message_ids = [e["message_id"] for e in emails if e.get("message_id")]
     async with async_session_factory() as db:
-        service = EmailService(db)
-        
-        for email_data in emails:
-            try:
-                # Skip emails sent by the system itself (prevents loops)
-                from_address = email_data.get("from_address", "").lower()
-                message_id = email_data.get("message_id", "")
-                
-                # Check if email is from our own system
-                if from_address == system_email:
-                    logger.info("Skipping self-sent email from %s", from_address)
-                    continue
-                
-                # Check if message ID indicates it's from our system
-                if "@fincas-agent>" in message_id:
-                    logger.info("Skipping system-generated email: %s", message_id)
-                    continue
-                
-                # Check if already processed
-                result = await db.execute(
-                    select(Email).where(Email.message_id == email_data["message_id"])
-                )
-                if result.scalar_one_or_none():
-                    logger.debug("Email %s already processed", email_data["message_id"])
-                    continue
-                
-                ticket, email_record = await service.process_inbound_email(
-                    message_id=email_data["message_id"],
-                    subject=email_data["subject"],
-                    body_text=email_data["body_text"],
-                    body_html=email_data["body_html"],
-                    from_address=email_data["from_address"],
-                    from_name=email_data["from_name"],
-                    to_address=email_data["to_address"],
-                    cc_addresses=email_data["cc_addresses"],
-                    received_at=email_data["received_at"],
-                    in_reply_to=email_data["in_reply_to"],
-                    references=email_data["references"],
-                    attachments_data=email_data["attachments"],
-                )
-                
-                logger.info(
-                    "Processed email %s -> Ticket %s",
-                    email_data["message_id"],
-                    ticket.ticket_code,
-                )
-                
-            except Exception as e:
-                logger.error("Error processing email %s: %s", email_data.get("message_id"), str(e))
+        result = await db.execute(
+            select(Email.message_id).where(Email.message_id.in_(message_ids))
+        )
+        already_processed = set(result.scalars().all())
+    
+    # Filter and group by sender: emails from the same sender are handled in
+    # order (they may belong to the same ticket), different senders in parallel
+    by_sender: Dict[str, List[dict]] = {}
+    for email_data in emails:
+        from_address = email_data.get("from_address", "").lower()
+        message_id = email_data.get("message_id", "")
+        
+        # The IMAP search already drops most of our own mail, but its FROM
+        # criterion is a substring match; this exact check is the real filter
+        if from_address == system_email:
+            logger.info("Skipping self-sent email from %s", from_address)
+            continue
+        
+        # Check if already processed
+        if message_id in already_processed:
+            logger.debug("Email %s already processed", message_id)
+            continue
+        already_processed.add(message_id)
+        
+        by_sender.setdefault(from_address, []).append(email_data)
+    
+    semaphore = asyncio.Semaphore(max(settings.email_processing_concurrency, 1))
+    await asyncio.gather(*[
+        _process_sender_emails(sender_emails, semaphore)
+        for sender_emails in by_sender.values()
+    ])
+
+
+async def _process_sender_emails(emails: List[dict], semaphore: asyncio.Semaphore) -> None:
+    """Process one sender's emails in order using a dedicated session"""
+    async with semaphore:
+        async with async_session_factory() as db:
+            service = EmailService(db)
+            
+            for email_data in emails:
+                try:
+                    ticket, email_record = await service.process_inbound_email(
+                        message_id=email_data["message_id"],
+                        subject=email_data["subject"],
+                        body_text=email_data["body_text"],
+                        body_html=email_data["body_html"],
+                        from_address=email_data["from_address"],
+                        from_name=email_data["from_name"],
+                        to_address=email_data["to_address"],
+                        cc_addresses=email_data["cc_addresses"],
+                        received_at=email_data["received_at"],
+                        in_reply_to=email_data["in_reply_to"],
+                        references=email_data["references"],
+                        attachments_data=email_data["attachments"],
+                    )
+                    
+                    logger.info(
+                        "Processed email %s -> Ticket %s",
+                        email_data["message_id"],
+                        ticket.ticket_code,
+                    )
+                    
+                except Exception as e:
+                    logger.error("Error processing email %s: %s", email_data.get("message_id"), str(e))
+                    await db.rollback()
@@ -5,7 +5,7 @@ import asyncio
 import logging
 
 from app.config import get_settings
-from app.services.email_service import process_emails
+from app.services.email_service import close_imap_poller, process_emails, wait_for_new_emails
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
@@ -20,6 +20,7 @@ async def email_worker_loop():
     _shutdown_event = asyncio.Event()
     
     logger.info("Email worker started - polling every %d seconds", settings.poll_interval_seconds)
+    use_idle = settings.imap_use_idle
     
     while not _shutdown_event.is_set():
         try:
@@ -27,6 +28,19 @@ async def email_worker_loop():
         except Exception as e:
             logger.error("Error in email worker: %s", str(e))
         
+        # Let the server push new mail instead of sleeping a full interval
+        if use_idle:
+            try:
+                idle_result = await wait_for_new_emails(
+                    settings.poll_interval_seconds, _shutdown_event.is_set
+                )
+                if idle_result is not None:
+                    continue
+                logger.info("IMAP IDLE not supported, falling back to polling")
+                use_idle = False
+            except Exception as e:
+                logger.error("Error waiting with IMAP IDLE: %s", str(e))
+        
         # Wait for next poll or shutdown
         try:
             await asyncio.wait_for(
@@ -71,5 +85,7 @@ async def stop_email_worker():
         
         logger.info("Email worker stopped")
     
+    await close_imap_poller()
+    
     _worker_task = None
     _shutdown_event = None
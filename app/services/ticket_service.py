@@ -2,21 +2,95 @@
 Ticket Service - Business logic for ticket management
 """
 import logging
-import random
+import secrets
 import string
-from datetime import datetime, timezone
-from typing import Optional
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
 
-from sqlalchemy import select
+from sqlalchemy import func, insert, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import lazyload
 
+from app.database import async_session_factory
 from app.models.event import Event
 from app.models.provider import Provider
-from app.models.ticket import Ticket, TicketStatus, Channel
+from app.models.ticket import Ticket, TicketStatus, Channel, Category
 from app.schemas import TicketCreate, TicketUpdate
+from app.services.background import spawn_background
 
 logger = logging.getLogger(__name__)
 
+TICKET_CODE_CHARS = string.ascii_uppercase + string.digits
+# Domain of the synthetic emails given to WhatsApp reporters without one
+PLACEHOLDER_EMAIL_DOMAIN = "@wa.placeholder.com"
+# Attempts before giving up on a ticket code collision
+MAX_TICKET_CODE_ATTEMPTS = 3
+# Unique index on tickets.ticket_code (001_initial)
+TICKET_CODE_INDEX = "ix_tickets_ticket_code"
+
+# Closure notification templates (rendered with str.format)
+_WA_CLOSURE_TMPL = """✅ *INCIDENCIA RESUELTA*
+
+📋 *Código:* {ticket_code}
+📝 *Asunto:* {subject}
+
+¡Su incidencia ha sido solucionada!
+
+Si tiene alguna duda o el problema persiste, responda a este mensaje.
+
+Gracias por su paciencia. 🙏"""
+
+_EMAIL_CLOSURE_SUBJECT_TMPL = "✅ Incidencia resuelta: {ticket_code}"
+
+_EMAIL_CLOSURE_BODY_TMPL = """Estimado/a {reporter_name},
+
+Nos complace informarle que su incidencia ha sido resuelta.
+
+📋 Código: {ticket_code}
+📝 Asunto: {subject}
+
+Si tiene alguna duda o el problema persiste, puede responder a este correo.
+
+Gracias por su paciencia.
+
+Atentamente,
+Administración de Fincas
+"""
+
+# Default providers rarely change; cache lookups per category for this long
+DEFAULT_PROVIDER_CACHE_TTL = 60
+
+
+class DefaultProvider(NamedTuple):
+    """Detached snapshot of a default provider, safe to share across sessions"""
+    id: int
+    name: str
+    email: str
+    contact_person: Optional[str]
+
+
+# category -> (expires_at, provider or None)
+_default_provider_cache: Dict[Category, Tuple[float, Optional[DefaultProvider]]] = {}
+
+
+def clear_default_provider_cache() -> None:
+    """Drop cached default providers (call after provider writes)"""
+    _default_provider_cache.clear()
+
+
+def _is_ticket_code_collision(exc: IntegrityError) -> bool:
+    """True when the violated constraint is the unique ticket_code index"""
+    orig = exc.orig
+    # asyncpg reports the constraint on the driver error wrapped by the DBAPI adapter
+    constraint = getattr(orig, "constraint_name", None) or getattr(
+        getattr(orig, "__cause__", None), "constraint_name", None
+    )
+    if constraint:
+        return constraint == TICKET_CODE_INDEX
+    message = str(orig)
+    return TICKET_CODE_INDEX in message or "tickets.ticket_code" in message
+
 
 class TicketService:
     """Service for ticket operations"""
@@ -26,81 +100,116 @@ class TicketService:
     
     def _generate_ticket_code(self) -> str:
         """Generate a unique ticket code like INC-XXXXXX"""
-        chars = string.ascii_uppercase + string.digits
-        random_part = ''.join(random.choices(chars, k=6))
+        random_part = ''.join(secrets.choice(TICKET_CODE_CHARS) for _ in range(6))
         return f"INC-{random_part}"
     
-    async def create_ticket(self, data: TicketCreate) -> Ticket:
-        """Create a new ticket with a unique code"""
-        # Generate unique ticket code
-        while True:
-            ticket_code = self._generate_ticket_code()
-            existing = await self.db.execute(
-                select(Ticket).where(Ticket.ticket_code == ticket_code)
-            )
-            if not existing.scalar_one_or_none():
-                break
+    async def create_ticket(
+        self,
+        data: TicketCreate,
+        status: TicketStatus = TicketStatus.NEW,
+        ai_context: Optional[dict] = None,
+        channel: Channel = Channel.EMAIL,
+        commit: bool = True,
+    ) -> Ticket:
+        """Create a new ticket with a unique code.
         
+        With commit=False the ticket is only flushed, so the caller can add
+        related changes and commit them together. The insert runs in a
+        SAVEPOINT, so a code collision keeps the caller's earlier changes.
+        """
         ticket = Ticket(
-            ticket_code=ticket_code,
+            ticket_code=self._generate_ticket_code(),
             subject=data.subject,
             description=data.description,
             category=data.category,
             priority=data.priority,
             reporter_email=data.reporter_email,
+            reporter_email_is_placeholder=data.reporter_email.endswith(PLACEHOLDER_EMAIL_DOMAIN),
             reporter_name=data.reporter_name,
+            reporter_phone=data.reporter_phone,
             community_name=data.community_name,
-            status=TicketStatus.NEW,
+            address=data.address,
+            location_detail=data.location_detail,
+            status=status,
+            ai_context=ai_context,
+            channel=channel,
         )
         
-        self.db.add(ticket)
-        await self.db.commit()
-        await self.db.refresh(ticket)
-        
-        # Create creation event
-        await self._create_event(
-            ticket.id,
-            "TICKET_CREATED",
-            f"Ticket {ticket_code} created",
-            {"category": data.category.value, "priority": data.priority.value},
-        )
+        # Rely on the unique constraint instead of probing for a free code;
+        # a collision is rare enough that retrying the insert is cheaper.
+        # The ticket and its creation event share one savepoint, so a failed
+        # attempt only undoes them and not the rest of the session
+        for attempt in range(1, MAX_TICKET_CODE_ATTEMPTS + 1):
+            try:
+                async with self.db.begin_nested():
+                    self.db.add(ticket)
+                    await self.db.flush()
+                    await self._create_event(
+                        ticket.id,
+                        "TICKET_CREATED",
+                        f"Ticket {ticket.ticket_code} created",
+                        {"category": data.category.value, "priority": data.priority.value},
+                    )
+                break
+            except IntegrityError as e:
+                # Only a code collision is worth retrying; NOT NULL/FK errors are bugs
+                if not _is_ticket_code_collision(e) or attempt == MAX_TICKET_CODE_ATTEMPTS:
+                    raise
+                logger.warning("Ticket code %s already in use, retrying", ticket.ticket_code)
+                ticket.ticket_code = self._generate_ticket_code()
         
+        if commit:
+            await self.db.commit()
         return ticket
     
+    async def _get_ticket(self, ticket_id: int) -> Optional[Ticket]:
+        """Load a ticket by id, skipping the email/event collections.
+        
+        Mutations only return TicketResponse, so eagerly loading emails (with
+        attachments) and events would cost three extra queries per call.
+        """
+        result = await self.db.execute(
+            select(Ticket)
+            .where(Ticket.id == ticket_id)
+            .options(lazyload(Ticket.emails), lazyload(Ticket.events))
+        )
+        return result.scalar_one_or_none()
+    
     async def update_ticket(self, ticket_id: int, data: TicketUpdate) -> Optional[Ticket]:
         """Update an existing ticket"""
-        result = await self.db.execute(select(Ticket).where(Ticket.id == ticket_id))
-        ticket = result.scalar_one_or_none()
+        ticket = await self._get_ticket(ticket_id)
         
         if not ticket:
             return None
         
-        update_data = data.model_dump(exclude_unset=True)
         changes = {}
         
-        for key, value in update_data.items():
+        # Read set fields directly instead of serializing them with model_dump
+        # (declaration order keeps the event description stable)
+        fields_set = data.model_fields_set
+        for key in TicketUpdate.model_fields:
+            if key not in fields_set:
+                continue
+            value = getattr(data, key)
             old_value = getattr(ticket, key)
             if old_value != value:
                 changes[key] = {"from": str(old_value), "to": str(value)}
                 setattr(ticket, key, value)
         
         if changes:
-            await self.db.commit()
-            await self.db.refresh(ticket)
-            
             await self._create_event(
                 ticket_id,
                 "TICKET_UPDATED",
                 f"Ticket updated: {', '.join(changes.keys())}",
                 changes,
             )
+            await self.db.commit()
         
         return ticket
     
     async def assign_provider(self, ticket_id: int, provider_id: int) -> Optional[Ticket]:
         """Assign a provider to a ticket"""
-        result = await self.db.execute(select(Ticket).where(Ticket.id == ticket_id))
-        ticket = result.scalar_one_or_none()
+        ticket = await self._get_ticket(ticket_id)
         
         if not ticket:
             return None
@@ -121,9 +230,6 @@ class TicketService:
         if ticket.status == TicketStatus.NEW:
             ticket.status = TicketStatus.DISPATCHED
         
-        await self.db.commit()
-        await self.db.refresh(ticket)
-        
         await self._create_event(
             ticket_id,
             "PROVIDER_ASSIGNED",
@@ -135,6 +241,7 @@ class TicketService:
                 "previous_provider_id": old_provider_id,
             },
         )
+        await self.db.commit()
         
         return ticket
     
@@ -145,8 +252,7 @@ class TicketService:
         comment: Optional[str] = None,
     ) -> Optional[Ticket]:
         """Change the status of a ticket"""
-        result = await self.db.execute(select(Ticket).where(Ticket.id == ticket_id))
-        ticket = result.scalar_one_or_none()
+        ticket = await self._get_ticket(ticket_id)
         
         if not ticket:
             return None
@@ -154,25 +260,27 @@ class TicketService:
         old_status = ticket.status
         ticket.status = new_status
         
-        # Set closed_at if closing
-        if new_status == TicketStatus.CLOSED and not ticket.closed_at:
-            ticket.closed_at = datetime.now(timezone.utc)
+        # Set closed_at if closing (stamped by the database clock)
+        stamp_closed_at = new_status == TicketStatus.CLOSED and not ticket.closed_at
+        if stamp_closed_at:
+            ticket.closed_at = func.now()
         elif new_status != TicketStatus.CLOSED:
             ticket.closed_at = None
         
-        await self.db.commit()
-        await self.db.refresh(ticket)
-        
         await self._create_event(
             ticket_id,
             "STATUS_CHANGED",
             comment or f"Status changed from {old_status.value} to {new_status.value}",
             {"from": old_status.value, "to": new_status.value},
         )
+        await self.db.commit()
+        if stamp_closed_at:
+            # Load the server-side value so the response carries it
+            await self.db.refresh(ticket, attribute_names=["closed_at"])
         
-        # Notify reporter when ticket is closed
+        # Notify reporter when ticket is closed, without holding up the caller
         if new_status == TicketStatus.CLOSED:
-            await self._notify_reporter_on_closure(ticket)
+            spawn_background(_notify_reporter_on_closure_background(ticket_id))
         
         return ticket
     
@@ -190,7 +298,7 @@ class TicketService:
                 await self._send_email_closure_notification(ticket)
             else:
                 # Fallback to email if available
-                if ticket.reporter_email and not ticket.reporter_email.endswith("@wa.placeholder.com"):
+                if ticket.reporter_email and not ticket.reporter_email_is_placeholder:
                     await self._send_email_closure_notification(ticket)
                 elif ticket.reporter_phone:
                     await self._send_whatsapp_closure_notification(ticket)
@@ -207,16 +315,10 @@ class TicketService:
         
         whatsapp = WhatsAppService(self.db)
         
-        message = f"""✅ *INCIDENCIA RESUELTA*
-
-📋 *Código:* {ticket.ticket_code}
-📝 *Asunto:* {ticket.subject}
-
-¡Su incidencia ha sido solucionada!
-
-Si tiene alguna duda o el problema persiste, responda a este mensaje.
-
-Gracias por su paciencia. 🙏"""
+        message = _WA_CLOSURE_TMPL.format(
+            ticket_code=ticket.ticket_code,
+            subject=ticket.subject,
+        )
         
         await whatsapp.send_message(ticket.reporter_phone, message)
     
@@ -226,21 +328,12 @@ Gracias por su paciencia. 🙏"""
         
         email_service = EmailService(self.db)
         
-        subject = f"✅ Incidencia resuelta: {ticket.ticket_code}"
-        body = f"""Estimado/a {ticket.reporter_name or 'vecino/a'},
-
-Nos complace informarle que su incidencia ha sido resuelta.
-
-📋 Código: {ticket.ticket_code}
-📝 Asunto: {ticket.subject}
-
-Si tiene alguna duda o el problema persiste, puede responder a este correo.
-
-Gracias por su paciencia.
-
-Atentamente,
-Administración de Fincas
-"""
+        subject = _EMAIL_CLOSURE_SUBJECT_TMPL.format(ticket_code=ticket.ticket_code)
+        body = _EMAIL_CLOSURE_BODY_TMPL.format(
+            reporter_name=ticket.reporter_name or 'vecino/a',
+            ticket_code=ticket.ticket_code,
+            subject=ticket.subject,
+        )
         
         await email_service.send_email(
             to=ticket.reporter_email,
@@ -249,16 +342,23 @@ Administración de Fincas
             ticket=ticket,
         )
     
-    async def get_default_provider_for_category(self, category) -> Optional[Provider]:
-        """Get the default provider for a category"""
+    async def get_default_provider_for_category(self, category: Category) -> Optional[DefaultProvider]:
+        """Get the default provider for a category (cached for a short TTL)"""
+        cached = _default_provider_cache.get(category)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
         result = await self.db.execute(
-            select(Provider).where(
+            select(Provider.id, Provider.name, Provider.email, Provider.contact_person).where(
                 (Provider.category == category) &
                 (Provider.is_default == True) &  # noqa: E712
                 (Provider.is_active == True)  # noqa: E712
             )
         )
-        return result.scalar_one_or_none()
+        row = result.first()
+        provider = DefaultProvider(*row) if row else None
+        _default_provider_cache[category] = (time.monotonic() + DEFAULT_PROVIDER_CACHE_TTL, provider)
+        return provider
     
     async def _create_event(
         self,
@@ -267,16 +367,26 @@ Administración de Fincas
         description: str,
         payload: dict,
         created_by: Optional[str] = None,
-    ) -> Event:
-        """Create an event for audit trail"""
-        event = Event(
+    ) -> None:
+        """Insert an audit trail event in the caller's transaction"""
+        await self.db.execute(insert(Event).values(
             ticket_id=ticket_id,
             event_type=event_type,
             description=description,
             payload=payload,
             created_by=created_by or "SYSTEM",
-        )
-        self.db.add(event)
-        await self.db.commit()
-        await self.db.refresh(event)
-        return event
+        ))
+
+
+async def _notify_reporter_on_closure_background(ticket_id: int) -> None:
+    """Send the closure notification using its own database session"""
+    try:
+        async with async_session_factory() as db:
+            service = TicketService(db)
+            ticket = await service._get_ticket(ticket_id)
+            if not ticket:
+                logger.warning("Ticket %s not found for closure notification", ticket_id)
+                return
+            await service._notify_reporter_on_closure(ticket)
+    except Exception as e:
+        logger.error("Closure notification failed for ticket %s: %s", ticket_id, str(e), exc_info=True)
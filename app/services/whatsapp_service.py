@@ -1,35 +1,39 @@
 """
 WhatsApp Service - Twilio integration for WhatsApp messaging
 """
+import asyncio
 import json
 import logging
 import re
-from typing import List, Optional, Tuple
+import string
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional, Tuple
 from datetime import datetime, timezone, timedelta
 
 from twilio.rest import Client
 from twilio.request_validator import RequestValidator
-from sqlalchemy import select
+from sqlalchemy import and_, case, exists, func, insert, literal, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import lazyload
 
 from app.config import get_settings
+from app.database import async_session_factory
 from app.models.ticket import Ticket, TicketStatus, Category, Priority, Channel
 from app.models.provider import Provider
 from app.models.reporter import Reporter
 from app.models.event import Event
 from app.schemas import TicketCreate
-from app.services.ticket_service import TicketService
-from app.services.ai_agent_service import AIAgentService
+from app.services.background import spawn_background
+from app.services.email_service import EmailService
+from app.services.ticket_service import PLACEHOLDER_EMAIL_DOMAIN, TicketService
+from app.services.ai_agent_service import MAX_STORED_HISTORY_MESSAGES, AIAgentService, IncidentAnalysis
 from app.services.classifier_service import ClassifierService
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
-# Commands that indicate user wants to start a new incident (exact match or at start)
-NEW_INCIDENT_COMMANDS_EXACT = [
-    "nueva", "nuevo", "reportar", "incidencia",
-]
-
 # Phrases that indicate new incident (can appear anywhere in message)
 NEW_INCIDENT_PHRASES = [
     "nueva incidencia", "nuevo problema", "otra incidencia", "otro problema",
@@ -45,23 +49,444 @@ NEW_INCIDENT_TIME_THRESHOLD = timedelta(hours=24)
 # Within this window, messages are assumed to be about the same incident unless clearly different
 ACTIVE_TICKET_WINDOW = timedelta(hours=2)
 
+# Keyword lists for the rule-based detectors
+GREETINGS = ["hola", "buenos días", "buenos dias", "buenas tardes", "buenas noches", "hey", "hi", "buenas"]
+CONFIRMATIONS = ["sí", "si", "correcto", "ok", "vale", "de acuerdo", "está bien", "esta bien", "afirmativo", "confirmo"]
+STATUS_KEYWORDS = [
+    "estado", "cómo va", "como va", "qué pasó", "que paso", "novedades",
+    "actualización", "actualizacion", "mis incidencias",
+]
+PROBLEM_KEYWORDS = [
+    "no funciona", "avería", "averia", "roto", "rota", "fuga", "gotea", "ruido",
+    "luz", "agua", "ascensor", "puerta", "cerradura", "suciedad", "basura",
+]
+# Phrases suggesting a different incident than the one in progress
+NEW_INCIDENT_KEYWORDS = [
+    "otro problema", "otra incidencia", "además tengo", "también tengo",
+    "nueva avería", "otra avería", "otro tema", "aparte de eso",
+    "tengo otro", "hay otro", "también hay", "otro asunto",
+]
+# Phrases stripped from the start of a message when building a ticket subject
+SUBJECT_PREFIXES = (
+    "tengo una nueva incidencia", "tengo un nuevo problema", "tengo una nueva", "tengo un nuevo",
+    "quiero reportar", "nueva incidencia", "nuevo problema", "reportar incidencia",
+    "buenas tardes", "buenos días", "buenos dias", "buenas noches",
+    "hola", "oye", "mira", "por favor", "necesito ayuda",
+)
+SUBJECT_CONNECTORS = ("que ", "de que ", "porque ", "ya que ", "es que ")
+_SUBJECT_LEADING_JUNK = ".,;:!¡¿?-–—" + string.whitespace
+
+# Room names that must not be stored as a floor/door
+ROOM_NAMES = [
+    "baño", "bano", "cocina", "salon", "salón", "dormitorio",
+    "habitacion", "habitación", "terraza", "balcon", "balcón", "pasillo",
+    "comedor", "aseo", "lavabo", "despensa", "trastero",
+]
+# Keywords per ticket category (keys are Category values)
+CATEGORY_KEYWORDS = {
+    Category.WATER.value: ["agua", "tubería", "fontanería", "grifo", "lavabo", "wc", "atasco", "fuga"],
+    Category.ELECTRICITY.value: ["luz", "electricidad", "enchufe", "interruptor", "corriente", "fusible"],
+    Category.ELEVATOR.value: ["ascensor", "elevador"],
+    Category.OTHER.value: ["grieta", "pared", "techo", "suelo", "estructura"],
+    Category.CLEANING.value: ["limpieza", "basura", "suciedad"],
+    Category.SECURITY.value: ["seguridad", "puerta", "cerradura", "portal"],
+}
+
+
+def _keyword_pattern(keywords: List[str]) -> str:
+    """Regex alternation matching any of the keywords (longest first)"""
+    return "|".join(re.escape(kw) for kw in sorted(keywords, key=len, reverse=True))
+
+
+# Each keyword set compiled once so a message is scanned in a single pass
+_NEW_INCIDENT_PHRASE_RE = re.compile(_keyword_pattern(NEW_INCIDENT_PHRASES))
+_STATUS_KEYWORD_RE = re.compile(_keyword_pattern(STATUS_KEYWORDS))
+_CONFIRMATION_RE = re.compile(rf"(?:{_keyword_pattern(CONFIRMATIONS)})\b")
+# Replies that are only an acknowledgement carry nothing new to analyze
+_BARE_ACK_RE = re.compile(rf"(?:{_keyword_pattern(CONFIRMATIONS + ['gracias', 'perfecto', 'no'])})[\s!.,]*")
+# Case-insensitive so callers don't need to lowercase the value first
+_ROOM_RE = re.compile(_keyword_pattern(ROOM_NAMES), re.IGNORECASE)
+_PROBLEM_KEYWORD_RE = re.compile(_keyword_pattern(PROBLEM_KEYWORDS))
+_NEW_INCIDENT_KEYWORD_RE = re.compile(_keyword_pattern(NEW_INCIDENT_KEYWORDS))
+# One named group per category; lastgroup tells which category matched
+_CATEGORY_RE = re.compile("|".join(
+    f"(?P<{category}>{_keyword_pattern(keywords)})" for category, keywords in CATEGORY_KEYWORDS.items()
+))
+# New-incident phrases and category keywords in one pass for the keyword detector
+_INCIDENT_SIGNAL_RE = re.compile(
+    f"(?P<new_incident>{_keyword_pattern(NEW_INCIDENT_KEYWORDS)})|{_CATEGORY_RE.pattern}"
+)
+
+
+def _is_room_name(value: str) -> bool:
+    """True if the value mentions a room (baño, cocina...) instead of a floor/door"""
+    return _ROOM_RE.search(value) is not None
+
+
+# A short reply that only answers the missing fields we asked for is parsed
+# locally instead of re-running the LLM analysis over the whole conversation
+QUICK_REPLY_MAX_LEN = 60
+_FLOOR_DOOR_RE = re.compile(r"\b(?:\d{1,2}\s*[ºª°]?|bajo|[aá]tico|entresuelo)\s*-?\s*[a-z]\b", re.IGNORECASE)
+_PHONE_NUMBER_RE = re.compile(r"\+?\d[\d\s-]{7,}\d")
+# missing field -> (extracted_info key, pattern)
+_QUICK_FIELD_EXTRACTORS = {
+    "location_detail": ("location_detail", _FLOOR_DOOR_RE),
+    "reporter_phone": ("reporter_phone", _PHONE_NUMBER_RE),
+    "reporter_contact": ("reporter_phone", _PHONE_NUMBER_RE),
+}
+# missing field -> ticket attribute that already answers it
+_FIELD_TICKET_ATTRS = {
+    "reporter_name": "reporter_name",
+    "reporter_phone": "reporter_phone",
+    "reporter_contact": "reporter_phone",
+    "address": "address",
+    "location_detail": "location_detail",
+    "community_name": "community_name",
+    "problem_description": "description",
+}
+
+
+def _sanitize_floor_door(value: Optional[str]) -> Optional[str]:
+    """The value if it can be a floor/door, None if empty or a room name"""
+    if not value or _is_room_name(value):
+        return None
+    return value
+
+
+# Prefix of the 'WhatsApp 1234' names given to reporters we know nothing about
+PLACEHOLDER_NAME_PREFIX = "WhatsApp"
+
+
+def _placeholder_name(phone: str) -> str:
+    """Placeholder reporter name from the last digits of the phone"""
+    return f"{PLACEHOLDER_NAME_PREFIX} {phone[-4:]}"
+
+
+def _is_placeholder_name(name: str) -> bool:
+    """True for a placeholder reporter name"""
+    return name.startswith(PLACEHOLDER_NAME_PREFIX)
+
+
+# extracted_info fields copied to the ticket attribute of the same name on a
+# follow-up, with the sanitizer applied first (location_detail must be a floor/door)
+_EXTRACTED_FIELD_SANITIZERS: Dict[str, Optional[Callable[[str], Optional[str]]]] = {
+    "address": None,
+    "location_detail": _sanitize_floor_door,
+    "reporter_phone": None,
+    "reporter_name": None,
+}
+
+
+_GREETING_SET = frozenset(GREETINGS)
+_GREETING_PREFIXES = tuple(f"{g} " for g in GREETINGS[:3])
+
+# Short messages whose intent is unambiguous; answered without calling the LLM
+_CONFIDENT_INTENTS = {
+    **dict.fromkeys(GREETINGS, "GREETING"),
+    **dict.fromkeys(CONFIRMATIONS, "CONFIRM_DATA"),
+}
+# Rule-detected intents trusted without the LLM for short messages that do
+# not mention a problem (those need the LLM's problem_description)
+_RULE_TRUSTED_INTENTS = frozenset({"GREETING", "CONFIRM_DATA", "CHECK_STATUS"})
+_RULE_TRUSTED_MAX_LEN = 40
+
+# User-facing status labels
+_STATUS_EMOJI = {
+    TicketStatus.NEW: "🆕",
+    TicketStatus.NEEDS_INFO: "⏳",
+    TicketStatus.IN_PROGRESS: "🔧",
+    TicketStatus.DISPATCHED: "🚗",
+}
+_STATUS_TEXT_SHORT = {
+    TicketStatus.NEW: "Pendiente",
+    TicketStatus.NEEDS_INFO: "Esperando información",
+    TicketStatus.IN_PROGRESS: "En proceso",
+    TicketStatus.DISPATCHED: "Técnico asignado",
+}
+_STATUS_TEXT_DETAIL = {
+    TicketStatus.NEW: "📋 Pendiente de asignación",
+    TicketStatus.NEEDS_INFO: "⏳ Esperando información adicional",
+    TicketStatus.IN_PROGRESS: "🔧 En proceso de reparación",
+    TicketStatus.DISPATCHED: "🚗 Técnico asignado",
+    TicketStatus.CLOSED: "🔒 Cerrada",
+}
+_STATUS_TEXT = {
+    TicketStatus.NEW: "Nueva - Pendiente de asignación",
+    TicketStatus.NEEDS_INFO: "Esperando información",
+    TicketStatus.IN_PROGRESS: "En proceso",
+    TicketStatus.DISPATCHED: "Asignada a proveedor",
+    TicketStatus.CLOSED: "Cerrada",
+}
+
+# WhatsApp reply templates (rendered with str.format)
+_COMPLETE_RESPONSE_TMPL = """✅ *INCIDENCIA REGISTRADA CORRECTAMENTE*
+
+📋 *Código de seguimiento:* {ticket_code}
+
+📝 *Resumen del problema:*
+{summary}
+
+🏷️ *Categoría:* {category}
+{location}
+━━━━━━━━━━━━━━━━━━━━━━
+✔️ Hemos notificado al técnico especializado.
+
+� *Le informaremos cuando la incidencia esté solucionada.*
+
+💾 *Guarde el código {ticket_code}* para consultar el estado de su incidencia.
+
+Si tiene alguna duda, responda a este mensaje."""
+
+_FOLLOWUP_HEADER_TMPL = """📋 *INCIDENCIA RECIBIDA*
+Código: *{ticket_code}*
+
+"""
+
+_FOLLOWUP_SUMMARY_TMPL = """📝 *Hemos entendido que su problema es:*
+"{summary}"
+
+"""
+
+_FOLLOWUP_MISSING_HEADER = "━━━━━━━━━━━━━━━━━━━━━━\n⚠️ *Para poder gestionar su incidencia necesitamos:*\n\n"
+
+_FOLLOWUP_COMPLETE_TEXT = """✅ Tenemos la información necesaria. Estamos procesando su incidencia.
+
+_Le notificaremos cuando esté resuelto._"""
+
+# known_data key -> label shown to the user and the analysis fields it answers
+_KNOWN_DATA_FIELDS = (
+    ("name", "👤 Nombre", ("reporter_name",)),
+    ("phone", "📱 Teléfono", ("reporter_phone", "reporter_contact")),
+    ("community", "🏢 Comunidad", ("community_name",)),
+    ("address", "📍 Dirección", ("address",)),
+    ("floor_door", "🚪 Piso/Puerta", ("location_detail",)),
+)
+
+# LLM prompts. The instructions are a fixed system message (identical on every
+# call so the provider can reuse its cached prefix); only the short user
+# message varies
+_INTENT_SYSTEM_PROMPT = """Eres un asistente que clasifica intenciones de mensajes. Solo gestionamos incidencias de edificios (fontanería, electricidad, ascensores, limpieza, seguridad). Responde solo en JSON.
+
+Analiza el mensaje de WhatsApp de un vecino/propietario y determina su intención.
+
+POSIBLES INTENCIONES:
+1. GREETING - Saludo simple (hola, buenos días, buenas tardes, etc.) sin más contenido
+2. NEW_INCIDENT - Está reportando un problema o avería (agua, luz, ascensor, limpieza, ruidos, etc.)
+3. CHECK_STATUS - Quiere saber el estado de sus incidencias abiertas
+4. PROVIDE_INFO - Está proporcionando información solicitada (nombre, dirección, datos, etc.)
+5. CONFIRM_DATA - Está confirmando que sus datos son correctos (sí, correcto, ok, vale, etc.)
+6. OFF_TOPIC - Pregunta sobre algo NO relacionado con incidencias del edificio (clima, política, recetas, chistes, etc.)
+7. UNCLEAR - No se puede determinar la intención
+
+Si la intención es NEW_INCIDENT, extrae la descripción del problema.
+Si es CHECK_STATUS y menciona un código específico, extráelo.
+
+Responde SOLO en JSON: {"intent": "INTENT_NAME", "problem_description": "si aplica", "ticket_code": "si menciona uno"}"""
+
+_INTENT_PROMPT_TMPL = """CONTEXTO DEL USUARIO:
+{context}
+
+MENSAJE DEL USUARIO:
+"{message}\""""
+
+_NEW_INCIDENT_SYSTEM_PROMPT = """Eres un asistente que analiza conversaciones de WhatsApp para determinar si un mensaje es sobre una nueva incidencia o la misma. Responde solo en JSON.
+
+Analiza si el nuevo mensaje de WhatsApp es sobre la MISMA incidencia existente o es una NUEVA incidencia diferente.
+
+Criterios para considerarlo NUEVA incidencia:
+1. Habla de un problema DIFERENTE (ej: antes era fontanería, ahora electricidad)
+2. Menciona una ubicación DIFERENTE (otro piso, otro edificio)
+3. Describe algo claramente NO relacionado con lo anterior
+4. Usa frases como "tengo otro problema", "además", "otra cosa"
+
+Criterios para considerarlo la MISMA incidencia:
+1. Proporciona información que se pidió (nombre, dirección, detalles)
+2. Da más detalles sobre el MISMO problema
+3. Pregunta sobre el estado de su incidencia
+4. Responde a preguntas previas
+
+Responde ÚNICAMENTE en formato JSON: {"is_new": true/false, "reason": "explicación breve"}"""
+
+_NEW_INCIDENT_PROMPT_TMPL = """
+INCIDENCIA EXISTENTE ({ticket_code}):
+- Categoría: {category}
+- Asunto: {subject}
+- Descripción: {description}
+- Dirección: {address}
+- Estado: {status}
+
+
+NUEVO MENSAJE DEL USUARIO:
+"{new_message}\""""
+
+# Strict output schema for the new-incident check: the model can only emit
+# this two-field object, so the answer is short and always well-formed
+_NEW_INCIDENT_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "incident_verdict",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "is_new": {"type": "boolean"},
+                "reason": {"type": "string"},
+            },
+            "required": ["is_new", "reason"],
+            "additionalProperties": False,
+        },
+    },
+}
+
+# Output caps for the JSON classification calls. The intent answer may echo
+# the problem description, so it gets more room than the yes/no check
+INTENT_MAX_TOKENS = 200
+NEW_INCIDENT_MAX_TOKENS = 120
+
+# LLM intent results keyed by (message, prompt context with the user's tickets)
+_INTENT_CACHE_SIZE = 1024
+_intent_cache: "OrderedDict[Tuple[str, str], Tuple[str, dict]]" = OrderedDict()
+
+# New-vs-same incident results keyed by (ticket id, ticket updated_at, message)
+_NEW_INCIDENT_CACHE_SIZE = 4096
+_new_incident_cache: "OrderedDict[Tuple[int, str, str], Tuple[bool, str]]" = OrderedDict()
+# Acknowledgements ("ok", "gracias"...) and very short replies that mention
+# no problem are follow-ups to the current ticket, no LLM needed
+ACK_MAX_LEN = 8
+_ACK_RE = re.compile(r"^(?:sí|si|no|ok|gracias|vale)\b")
+
+
+# Separators stripped from phone numbers before lookups
+_PHONE_STRIP_TABLE = str.maketrans("", "", string.whitespace + "-().")
+# Spanish national numbers (9 digits starting with 6-9), stored without prefix
+_ES_NATIONAL_RE = re.compile(r"[6-9]\d{8}")
+DEFAULT_COUNTRY_PREFIX = "+34"
+
+
+@lru_cache(maxsize=4096)
+def _canonical_phone(raw: str) -> str:
+    """E.164-style form of a phone number: 'whatsapp:+34 612-345-678' / '0034612345678' -> '+34612345678'"""
+    phone = raw.replace("whatsapp:", "").translate(_PHONE_STRIP_TABLE)
+    if phone.startswith("00"):
+        return f"+{phone[2:]}"
+    if _ES_NATIONAL_RE.fullmatch(phone):
+        return f"{DEFAULT_COUNTRY_PREFIX}{phone}"
+    if phone and not phone.startswith("+"):
+        return f"+{phone}"
+    return phone
+
+
+@lru_cache(maxsize=4096)
+def _phone_variants(phone: str) -> Tuple[str, ...]:
+    """Stored formats a phone number may appear in (canonical first, then without + and national)"""
+    phone_canonical = _canonical_phone(phone)
+    variants = [phone_canonical, phone_canonical[1:]]
+    if phone_canonical.startswith(DEFAULT_COUNTRY_PREFIX):
+        variants.append(phone_canonical[len(DEFAULT_COUNTRY_PREFIX):])
+    return tuple(dict.fromkeys(variants))
+
+
+def _placeholder_email(phone: str) -> str:
+    """Placeholder email for a WhatsApp user: +34612345678 -> whatsapp_34612345678@wa.placeholder.com"""
+    return f"whatsapp_{_canonical_phone(phone).lstrip('+')}{PLACEHOLDER_EMAIL_DOMAIN}"
+
+
+@lru_cache(maxsize=1)
+def _twilio_client() -> Optional[Client]:
+    """Twilio REST client, built once per process (None if not configured)"""
+    if not (settings.twilio_account_sid and settings.twilio_auth_token):
+        logger.warning("Twilio credentials not configured")
+        return None
+    return Client(settings.twilio_account_sid, settings.twilio_auth_token)
+
+
+@lru_cache(maxsize=1)
+def _twilio_validator() -> Optional[RequestValidator]:
+    """Twilio webhook signature validator, built once per process"""
+    if not settings.twilio_auth_token:
+        return None
+    return RequestValidator(settings.twilio_auth_token)
+
+
+# The AI agent and the classifier hold no per-request state, so every
+# service instance shares them
+_ai_agent = AIAgentService()
+_classifier = ClassifierService()
+
+
+# Replies to messages seen in the last few seconds, keyed by Twilio's MessageSid,
+# so webhook retries don't run the whole pipeline (and create tickets) twice.
+# A retry that arrives while the first delivery is still being processed
+# waits for that reply instead of starting a second run
+RECENT_RESPONSE_TTL = 10
+RECENT_RESPONSE_MAX = 4096
+_recent_responses: Dict[str, Tuple[float, str]] = {}
+_inflight_responses: Dict[str, asyncio.Future] = {}
+
+
+def _get_recent_response(message_sid: str) -> Optional[str]:
+    """Reply already sent for this message, if still fresh"""
+    cached = _recent_responses.get(message_sid)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    return None
+
+
+def _remember_response(message_sid: str, response: str) -> None:
+    """Store a reply for RECENT_RESPONSE_TTL seconds"""
+    now = time.monotonic()
+    if len(_recent_responses) >= RECENT_RESPONSE_MAX:
+        for key in [k for k, (expires, _) in _recent_responses.items() if expires <= now]:
+            del _recent_responses[key]
+        # Still full: drop the oldest entries (dicts keep insertion order)
+        while len(_recent_responses) >= RECENT_RESPONSE_MAX:
+            del _recent_responses[next(iter(_recent_responses))]
+    _recent_responses[message_sid] = (now + RECENT_RESPONSE_TTL, response)
+
+
+async def _persist_event_background(event_data: dict) -> None:
+    """Insert an informational event using its own database session"""
+    try:
+        async with async_session_factory() as db:
+            await db.execute(insert(Event), [event_data])
+            await db.commit()
+    except Exception as e:
+        logger.error("Failed to store %s event for ticket %s: %s",
+                     event_data.get("event_type"), event_data.get("ticket_id"), str(e))
+
+
+# Background provider notifications running at once (each holds a DB session;
+# the email sends themselves are throttled by the email service)
+PROVIDER_NOTIFY_CONCURRENCY = 5
+_provider_notify_semaphore = asyncio.Semaphore(PROVIDER_NOTIFY_CONCURRENCY)
+
+
+async def _notify_default_provider_background(ticket_id: int) -> None:
+    """Notify the default provider of a ticket using its own database session"""
+    try:
+        async with _provider_notify_semaphore, async_session_factory() as db:
+            ticket = await db.get(
+                Ticket, ticket_id, options=[lazyload(Ticket.emails), lazyload(Ticket.events)]
+            )
+            if not ticket:
+                logger.warning("Ticket %s not found for provider notification", ticket_id)
+                return
+            await EmailService(db)._notify_default_provider(ticket)
+    except Exception as e:
+        logger.error("Failed to notify provider for ticket %s: %s", ticket_id, str(e))
+
 
 class WhatsAppService:
     """Service for handling WhatsApp messages via Twilio."""
     
     def __init__(self, db: AsyncSession):
         self.db = db
-        self.client = None
-        self.validator = None
-        
-        if settings.twilio_account_sid and settings.twilio_auth_token:
-            self.client = Client(settings.twilio_account_sid, settings.twilio_auth_token)
-            self.validator = RequestValidator(settings.twilio_auth_token)
-        else:
-            logger.warning("Twilio credentials not configured")
+        self.client = _twilio_client()
+        self.validator = _twilio_validator() if self.client else None
         
-        self.ai_agent = AIAgentService()
-        self.classifier = ClassifierService()
+        self.ai_agent = _ai_agent
+        self.classifier = _classifier
+        self.ticket_service = TicketService(db)
     
     def validate_request(self, url: str, params: dict, signature: str) -> bool:
         """Validate that the request comes from Twilio."""
@@ -73,16 +498,8 @@ class WhatsAppService:
     @staticmethod
     def _is_valid_floor_door(value: str) -> bool:
         """Check if a value is a valid floor/door (not a room name)."""
-        if not value:
-            return False
-        value_lower = value.lower()
-        # Room names that should NOT be saved as floor/door
-        invalid_values = [
-            "baño", "bano", "cocina", "salon", "salón", "dormitorio", 
-            "habitacion", "habitación", "terraza", "balcon", "balcón", 
-            "pasillo", "comedor", "aseo", "lavabo", "despensa", "trastero"
-        ]
-        return not any(room in value_lower for room in invalid_values)
+        # Room names should NOT be saved as floor/door
+        return _sanitize_floor_door(value) is not None
     
     @staticmethod
     def _generate_clean_subject(message: str, ai_summary: Optional[str] = None) -> str:
@@ -90,27 +507,6 @@ class WhatsAppService:
         Generate a clean, concise subject (5-10 words) for the ticket.
         Removes unnecessary phrases and uses AI summary if available.
         """
-        # Phrases to remove from the beginning
-        remove_phrases = [
-            "tengo una nueva incidencia",
-            "tengo un nuevo problema",
-            "tengo una nueva",
-            "tengo un nuevo",
-            "quiero reportar",
-            "nueva incidencia",
-            "nuevo problema",
-            "reportar incidencia",
-            "buenas tardes",
-            "buenos días",
-            "buenos dias",
-            "buenas noches",
-            "hola",
-            "oye",
-            "mira",
-            "por favor",
-            "necesito ayuda",
-        ]
-        
         # Use AI summary if available and not empty
         if ai_summary and len(ai_summary.strip()) > 5:
             subject = ai_summary.strip()
@@ -120,16 +516,13 @@ class WhatsAppService:
         
         # Remove common prefixes (case insensitive)
         subject_lower = subject.lower()
-        for phrase in remove_phrases:
+        for phrase in SUBJECT_PREFIXES:
             if subject_lower.startswith(phrase):
-                subject = subject[len(phrase):].strip()
+                # Remove the phrase and the punctuation after it
+                subject = subject[len(phrase):].lstrip(_SUBJECT_LEADING_JUNK)
                 subject_lower = subject.lower()
-                # Remove leading punctuation and connectors
-                while subject and subject[0] in ".,;:!¡¿?-–—":
-                    subject = subject[1:].strip()
-                    subject_lower = subject.lower()
                 # Remove connector words at the start
-                for connector in ["que ", "de que ", "porque ", "ya que ", "es que "]:
+                for connector in SUBJECT_CONNECTORS:
                     if subject_lower.startswith(connector):
                         subject = subject[len(connector):].strip()
                         subject_lower = subject.lower()
@@ -164,16 +557,56 @@ class WhatsAppService:
         Process an incoming WhatsApp message using AI to understand intent.
         Returns the response message to send back.
         """
-        logger.info("Processing WhatsApp message from %s: %s", from_number, body[:100])
+        logger.info("Processing WhatsApp message from %s: %.100s", from_number, body)
         
-        # Normalize phone number (remove 'whatsapp:' prefix if present)
-        phone = from_number.replace("whatsapp:", "").strip()
+        # Normalize phone number once (drops the 'whatsapp:' prefix)
+        phone = _canonical_phone(from_number)
         
-        # Find existing ticket that needs info (priority handling)
-        pending_ticket = await self._find_ticket_needing_info(phone)
+        cached_response = _get_recent_response(message_sid)
+        if cached_response is not None:
+            logger.info("Duplicate WhatsApp message %s from %s, replaying previous reply", message_sid, phone)
+            return cached_response
         
-        # Get all open tickets for this user
-        open_tickets = await self._find_all_open_tickets(phone)
+        inflight = _inflight_responses.get(message_sid)
+        if inflight is not None:
+            logger.info("WhatsApp message %s from %s is already being processed, waiting for its reply",
+                        message_sid, phone)
+            return await asyncio.shield(inflight)
+        
+        future = asyncio.get_running_loop().create_future()
+        _inflight_responses[message_sid] = future
+        try:
+            response = await self._respond_to_message(phone, body, profile_name)
+            future.set_result(response)
+        except Exception as e:
+            # Retries waiting on this message fail the same way; mark the
+            # exception as retrieved so asyncio doesn't log it when none waited
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del _inflight_responses[message_sid]
+            if not future.done():
+                future.cancel()
+        
+        if response:
+            _remember_response(message_sid, response)
+        return response
+    
+    async def _respond_to_message(
+        self,
+        phone: str,
+        body: str,
+        profile_name: Optional[str],
+    ) -> Optional[str]:
+        """Detect the intent of a message and build the reply."""
+        # Load the reporter and all open tickets for this user in one query,
+        # and derive the ticket that needs info (priority handling) from that list
+        reporter, open_tickets = await self._load_user_context(phone)
+        pending_ticket = self._find_ticket_needing_info(open_tickets)
+        # End the read-only transaction so no pooled connection is held during
+        # the LLM calls below (loaded objects stay usable, expire_on_commit=False)
+        await self.db.commit()
         
         # Use AI to understand the user's intent
         intent, intent_data = await self._detect_user_intent(body, pending_ticket, open_tickets)
@@ -181,11 +614,11 @@ class WhatsAppService:
         logger.info("Detected intent: %s, data: %s", intent, intent_data)
         
         # Find most recent active ticket (within 2 hours, any status except resolved/closed)
-        recent_active_ticket = await self._find_recent_active_ticket(phone)
+        recent_active_ticket = self._find_recent_active_ticket(open_tickets)
         
         # Handle based on intent
         if intent == "GREETING":
-            return await self._handle_greeting(phone, profile_name, open_tickets, pending_ticket)
+            return self._handle_greeting(phone, profile_name, open_tickets, pending_ticket)
         
         elif intent == "NEW_INCIDENT":
             # IMPORTANT: Check if there's a recent active ticket before creating a new one
@@ -198,29 +631,29 @@ class WhatsAppService:
                 
                 if not is_new:
                     # Treat as providing info for existing ticket
-                    return await self._process_info_response(recent_active_ticket, body, phone)
+                    return await self._process_info_response(recent_active_ticket, body, phone, reporter)
             
             # User wants to report a new incident
             problem_description = intent_data.get("problem_description", body)
-            return await self._create_ticket_from_message(phone, problem_description, profile_name)
+            return await self._create_ticket_from_message(phone, problem_description, profile_name, reporter)
         
         elif intent == "CHECK_STATUS":
-            return await self._handle_status_check(phone, open_tickets, intent_data)
+            return self._handle_status_check(phone, open_tickets, intent_data)
         
         elif intent == "PROVIDE_INFO":
             # User is providing info for a pending ticket
             target_ticket = pending_ticket or recent_active_ticket
             if target_ticket:
-                return await self._process_info_response(target_ticket, body, phone)
+                return await self._process_info_response(target_ticket, body, phone, reporter)
             else:
                 # No active ticket, create one
-                return await self._create_ticket_from_message(phone, body, profile_name)
+                return await self._create_ticket_from_message(phone, body, profile_name, reporter)
         
         elif intent == "CONFIRM_DATA":
             # User confirmed their data is correct
             target_ticket = pending_ticket or recent_active_ticket
             if target_ticket:
-                return await self._process_info_response(target_ticket, body, phone)
+                return await self._process_info_response(target_ticket, body, phone, reporter)
             return self._format_welcome_message(profile_name, open_tickets)
         
         elif intent == "OFF_TOPIC":
@@ -230,7 +663,7 @@ class WhatsAppService:
             # If unclear but there's a recent ticket, assume info for that ticket
             if recent_active_ticket:
                 logger.info("Unclear intent but recent ticket exists, treating as info")
-                return await self._process_info_response(recent_active_ticket, body, phone)
+                return await self._process_info_response(recent_active_ticket, body, phone, reporter)
             return self._format_help_message(profile_name, open_tickets, pending_ticket)
     
     async def _detect_user_intent(
@@ -252,52 +685,45 @@ class WhatsAppService:
         - OFF_TOPIC: Question unrelated to incident management
         - UNCLEAR: Can't determine intent
         """
+        msg_key = message.lower().strip().rstrip("!.¡ ")
+        confident_intent = _CONFIDENT_INTENTS.get(msg_key)
+        if confident_intent:
+            return confident_intent, {}
+        
+        if len(message) < _RULE_TRUSTED_MAX_LEN and not _PROBLEM_KEYWORD_RE.search(msg_key):
+            intent, data = self._simple_intent_detection(message, pending_ticket)
+            if intent in _RULE_TRUSTED_INTENTS:
+                return intent, data
+        
+        # Build context about user's situation
+        context_parts = []
+        if pending_ticket:
+            context_parts.append(f"- Tiene una incidencia pendiente ({pending_ticket.ticket_code}) esperando información")
+        if open_tickets:
+            tickets_summary = ", ".join([f"{t.ticket_code} ({t.status.value})" for t in open_tickets[:5]])
+            context_parts.append(f"- Tiene {len(open_tickets)} incidencia(s) abierta(s): {tickets_summary}")
+        
+        context = "\n".join(context_parts) if context_parts else "- No tiene incidencias abiertas"
+        
+        # The context carries the user's own ticket codes, so a cached result
+        # (which may name a ticket_code) is only reused for the same tickets
+        cache_key = (msg_key, context)
+        cached = _intent_cache.get(cache_key)
+        if cached:
+            _intent_cache.move_to_end(cache_key)
+            return cached[0], dict(cached[1])
+        
         try:
-            # Build context about user's situation
-            context_parts = []
-            if pending_ticket:
-                context_parts.append(f"- Tiene una incidencia pendiente ({pending_ticket.ticket_code}) esperando información")
-            if open_tickets:
-                tickets_summary = ", ".join([f"{t.ticket_code} ({t.status.value})" for t in open_tickets[:5]])
-                context_parts.append(f"- Tiene {len(open_tickets)} incidencia(s) abierta(s): {tickets_summary}")
-            
-            context = "\n".join(context_parts) if context_parts else "- No tiene incidencias abiertas"
-            
-            prompt = f"""Analiza el siguiente mensaje de WhatsApp de un vecino/propietario y determina su intención.
-
-CONTEXTO DEL USUARIO:
-{context}
-
-MENSAJE DEL USUARIO:
-"{message}"
-
-POSIBLES INTENCIONES:
-1. GREETING - Saludo simple (hola, buenos días, buenas tardes, etc.) sin más contenido
-2. NEW_INCIDENT - Está reportando un problema o avería (agua, luz, ascensor, limpieza, ruidos, etc.)
-3. CHECK_STATUS - Quiere saber el estado de sus incidencias abiertas
-4. PROVIDE_INFO - Está proporcionando información solicitada (nombre, dirección, datos, etc.)
-5. CONFIRM_DATA - Está confirmando que sus datos son correctos (sí, correcto, ok, vale, etc.)
-6. OFF_TOPIC - Pregunta sobre algo NO relacionado con incidencias del edificio (clima, política, recetas, chistes, etc.)
-7. UNCLEAR - No se puede determinar la intención
-
-Si la intención es NEW_INCIDENT, extrae la descripción del problema.
-Si es CHECK_STATUS y menciona un código específico, extráelo.
-
-Responde SOLO en JSON: {{"intent": "INTENT_NAME", "problem_description": "si aplica", "ticket_code": "si menciona uno"}}"""
+            prompt = _INTENT_PROMPT_TMPL.format(context=context, message=message)
 
             if self.ai_agent.client:
-                response = await self.ai_agent.client.chat.completions.create(
-                    model=self.ai_agent.model,
-                    messages=[
-                        {"role": "system", "content": "Eres un asistente que clasifica intenciones de mensajes. Solo gestionamos incidencias de edificios (fontanería, electricidad, ascensores, limpieza, seguridad). Responde solo en JSON."},
-                        {"role": "user", "content": prompt},
-                    ],
-                    response_format={"type": "json_object"},
-                    temperature=0.2,
+                result = await self._classify_json(
+                    _INTENT_SYSTEM_PROMPT, prompt, temperature=0.2, max_tokens=INTENT_MAX_TOKENS
                 )
-                
-                result = json.loads(response.choices[0].message.content)
                 intent = result.get("intent", "UNCLEAR")
+                _intent_cache[cache_key] = (intent, dict(result))
+                if len(_intent_cache) > _INTENT_CACHE_SIZE:
+                    _intent_cache.popitem(last=False)
                 return intent, result
             
             # Fallback to simple detection
@@ -307,28 +733,60 @@ Responde SOLO en JSON: {{"intent": "INTENT_NAME", "problem_description": "si apl
             logger.error("Error detecting intent: %s", str(e))
             return self._simple_intent_detection(message, pending_ticket)
     
+    async def _classify_json(
+        self,
+        system_prompt: str,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        response_format: Optional[dict] = None,
+    ) -> dict:
+        """Run a JSON classification call with a short timeout and one longer retry.
+        
+        Raises asyncio.TimeoutError if both attempts time out, so callers fall
+        back to their rule-based detection.
+        """
+        timeout = settings.llm_intent_timeout
+        for attempt in range(2):
+            try:
+                response = await asyncio.wait_for(
+                    self.ai_agent.client.chat.completions.create(
+                        model=settings.openai_intent_model or self.ai_agent.model,
+                        messages=[
+                            {"role": "system", "content": system_prompt},
+                            {"role": "user", "content": prompt},
+                        ],
+                        response_format=response_format or {"type": "json_object"},
+                        temperature=temperature,
+                        max_tokens=max_tokens,
+                        seed=0,
+                    ),
+                    timeout=timeout * (attempt + 1),
+                )
+                return json.loads(response.choices[0].message.content)
+            except asyncio.TimeoutError:
+                if attempt:
+                    raise
+                logger.warning("LLM classification timed out after %.1fs, retrying", timeout)
+    
     def _simple_intent_detection(self, message: str, pending_ticket: Optional[Ticket]) -> Tuple[str, dict]:
         """Simple keyword-based intent detection as fallback."""
         msg_lower = message.lower().strip()
         
         # Greetings
-        greetings = ["hola", "buenos días", "buenos dias", "buenas tardes", "buenas noches", "hey", "hi", "buenas"]
-        if msg_lower in greetings or any(msg_lower.startswith(g + " ") for g in greetings[:3]) and len(msg_lower) < 20:
+        if msg_lower in _GREETING_SET or msg_lower.startswith(_GREETING_PREFIXES) and len(msg_lower) < 20:
             return "GREETING", {}
         
         # New incident keywords (anywhere in message)
-        for phrase in NEW_INCIDENT_PHRASES:
-            if phrase in msg_lower:
-                return "NEW_INCIDENT", {"problem_description": message}
+        if _NEW_INCIDENT_PHRASE_RE.search(msg_lower):
+            return "NEW_INCIDENT", {"problem_description": message}
         
         # Status check
-        status_keywords = ["estado", "cómo va", "como va", "qué pasó", "que paso", "novedades", "actualización", "actualizacion", "mis incidencias"]
-        if any(kw in msg_lower for kw in status_keywords):
+        if _STATUS_KEYWORD_RE.search(msg_lower):
             return "CHECK_STATUS", {}
         
-        # Confirmation
-        confirmations = ["sí", "si", "correcto", "ok", "vale", "de acuerdo", "está bien", "esta bien", "afirmativo", "confirmo"]
-        if msg_lower in confirmations or any(msg_lower.startswith(c) for c in confirmations):
+        # Confirmation (exact or at the start of the message)
+        if _CONFIRMATION_RE.match(msg_lower):
             return "CONFIRM_DATA", {}
         
         # If there's a pending ticket and message has useful info, assume PROVIDE_INFO
@@ -336,110 +794,79 @@ Responde SOLO en JSON: {{"intent": "INTENT_NAME", "problem_description": "si apl
             return "PROVIDE_INFO", {}
         
         # Check for problem indicators (might be new incident)
-        problem_keywords = ["no funciona", "avería", "averia", "roto", "rota", "fuga", "gotea", "ruido", 
-                          "luz", "agua", "ascensor", "puerta", "cerradura", "suciedad", "basura"]
-        if any(kw in msg_lower for kw in problem_keywords):
+        if _PROBLEM_KEYWORD_RE.search(msg_lower):
             return "NEW_INCIDENT", {"problem_description": message}
         
         return "UNCLEAR", {}
     
-    async def _find_ticket_needing_info(self, phone: str) -> Optional[Ticket]:
-        """Find a ticket that is waiting for information from this user."""
-        # Try multiple phone formats
-        phone_clean = phone.strip().replace(" ", "").replace("-", "")
-        phone_variants = [
-            phone_clean,
-            phone_clean.replace("+", ""),
-            f"+{phone_clean}" if not phone_clean.startswith("+") else phone_clean,
-        ]
-        
-        for variant in phone_variants:
-            result = await self.db.execute(
-                select(Ticket)
-                .where(
-                    Ticket.reporter_phone == variant,
-                    Ticket.status == TicketStatus.NEEDS_INFO,
-                )
-                .order_by(Ticket.created_at.desc())
-                .limit(1)
-            )
-            ticket = result.scalar_one_or_none()
-            if ticket:
-                return ticket
-        
-        return None
+    @staticmethod
+    def _find_ticket_needing_info(open_tickets: List[Ticket]) -> Optional[Ticket]:
+        """Find the most recent ticket waiting for information from this user."""
+        return next(
+            (t for t in open_tickets if t.status == TicketStatus.NEEDS_INFO),
+            None,
+        )
     
-    async def _find_recent_active_ticket(self, phone: str) -> Optional[Ticket]:
+    @staticmethod
+    def _find_recent_active_ticket(open_tickets: List[Ticket]) -> Optional[Ticket]:
         """
         Find the most recent active ticket for this user within ACTIVE_TICKET_WINDOW.
         This helps prevent duplicate tickets when user is providing info for an existing one.
         """
-        # Try multiple phone formats
-        phone_clean = phone.strip().replace(" ", "").replace("-", "")
-        phone_variants = [
-            phone_clean,
-            phone_clean.replace("+", ""),
-            f"+{phone_clean}" if not phone_clean.startswith("+") else phone_clean,
-        ]
-        
         # Calculate cutoff time
         cutoff_time = datetime.now(timezone.utc) - ACTIVE_TICKET_WINDOW
         
-        for variant in phone_variants:
-            result = await self.db.execute(
-                select(Ticket)
-                .where(
-                    Ticket.reporter_phone == variant,
-                    Ticket.status.in_([
-                        TicketStatus.NEW,
-                        TicketStatus.NEEDS_INFO,
-                        TicketStatus.IN_PROGRESS,
-                    ]),
-                    Ticket.created_at >= cutoff_time,
-                )
-                .order_by(Ticket.created_at.desc())
-                .limit(1)
-            )
-            ticket = result.scalar_one_or_none()
-            if ticket:
+        # open_tickets is ordered newest first
+        for ticket in open_tickets:
+            if ticket.created_at < cutoff_time:
+                break
+            if ticket.status in (TicketStatus.NEW, TicketStatus.NEEDS_INFO, TicketStatus.IN_PROGRESS):
                 logger.info("Found recent active ticket %s (created %s)", 
                            ticket.ticket_code, ticket.created_at)
                 return ticket
         
         return None
     
-    async def _find_all_open_tickets(self, phone: str) -> List[Ticket]:
-        """Find all open tickets for this phone number."""
-        phone_clean = phone.strip().replace(" ", "").replace("-", "")
-        phone_variants = [
-            phone_clean,
-            phone_clean.replace("+", ""),
-            f"+{phone_clean}" if not phone_clean.startswith("+") else phone_clean,
-        ]
-        
-        tickets = []
-        for variant in phone_variants:
-            result = await self.db.execute(
-                select(Ticket)
-                .where(
-                    Ticket.reporter_phone == variant,
-                    Ticket.status.in_([
-                        TicketStatus.NEW,
-                        TicketStatus.NEEDS_INFO,
-                        TicketStatus.IN_PROGRESS,
-                        TicketStatus.DISPATCHED,
-                    ])
-                )
-                .order_by(Ticket.created_at.desc())
-            )
-            found = result.scalars().all()
-            for t in found:
-                if t not in tickets:
-                    tickets.append(t)
-        
-        return tickets
+    async def _load_user_context(self, phone: str) -> Tuple[Optional[Reporter], List[Ticket]]:
+        """
+        Load the reporter and all open tickets (newest first) for this phone
+        number in a single round-trip. The reporter is None if there is none
+        or if the phone belongs to a provider.
+        """
+        phone_variants = _phone_variants(phone)
+        is_provider = exists().where(
+            Provider.phone.in_(phone_variants) |
+            Provider.phone_emergency.in_(phone_variants)
+        )
+        # One-row anchor so the user context is returned even when the
+        # reporter or the tickets are missing
+        anchor = select(literal(1).label("anchor")).subquery()
+        result = await self.db.execute(
+            select(Reporter, Ticket)
+            .select_from(anchor)
+            .outerjoin(Reporter, and_(Reporter.phone.in_(phone_variants), ~is_provider))
+            .outerjoin(Ticket, and_(
+                Ticket.reporter_phone.in_(phone_variants),
+                Ticket.status.in_([
+                    TicketStatus.NEW,
+                    TicketStatus.NEEDS_INFO,
+                    TicketStatus.IN_PROGRESS,
+                    TicketStatus.DISPATCHED,
+                ]),
+            ))
+            .order_by(Ticket.created_at.desc())
+            # The WhatsApp flow never reads emails/events; skip their selectin loads
+            .options(lazyload(Ticket.emails), lazyload(Ticket.events))
+        )
+        reporter = None
+        tickets = {}
+        for row_reporter, row_ticket in result.all():
+            reporter = reporter or row_reporter
+            if row_ticket is not None:
+                tickets.setdefault(row_ticket.id, row_ticket)
+        return reporter, list(tickets.values())
     
-    async def _handle_greeting(
+    def _handle_greeting(
         self, 
         phone: str, 
         profile_name: Optional[str],
@@ -458,39 +885,39 @@ Responde SOLO en JSON: {{"intent": "INTENT_NAME", "problem_description": "si apl
         """Format a welcome message with available options."""
         name = profile_name or "vecino/a"
         
-        response = f"""👋 *¡Hola {name}!*
+        parts = [f"""👋 *¡Hola {name}!*
 
 Soy el asistente de *Administración de Fincas*. Puedo ayudarte con:
 
-"""
+"""]
         
         # If there's a pending ticket, mention it first
         if pending_ticket:
-            response += f"""⚠️ *Tienes una incidencia pendiente de información:*
+            parts.append(f"""⚠️ *Tienes una incidencia pendiente de información:*
 📋 {pending_ticket.ticket_code}: {pending_ticket.subject[:50]}...
 _Responde con los datos que te pedimos para procesarla._
 
-"""
+""")
         
-        response += """📝 *Reportar una incidencia*
+        parts.append("""📝 *Reportar una incidencia*
    Cuéntame el problema (ej: "no funciona la luz del portal")
 
-"""
+""")
         
-        if open_tickets and len(open_tickets) > 0:
-            response += f"""📊 *Consultar estado* de tus {len(open_tickets)} incidencia(s) abierta(s)
+        if open_tickets:
+            parts.append(f"""📊 *Consultar estado* de tus {len(open_tickets)} incidencia(s) abierta(s)
    Escribe "estado" o "mis incidencias"
 
-"""
+""")
         
-        response += """❓ *Ayuda*
+        parts.append("""❓ *Ayuda*
    Escribe "ayuda" para ver más opciones
 
-¿En qué puedo ayudarte?"""
+¿En qué puedo ayudarte?""")
         
-        return response
+        return "".join(parts)
     
-    async def _handle_status_check(
+    def _handle_status_check(
         self, 
         phone: str, 
         open_tickets: List[Ticket],
@@ -511,73 +938,48 @@ _Responde con los datos que te pedimos para procesarla._
 
 Si quieres reportar un problema, simplemente cuéntame qué ocurre."""
         
-        response = f"""📊 *Tus incidencias abiertas ({len(open_tickets)}):*
+        parts = [f"""📊 *Tus incidencias abiertas ({len(open_tickets)}):*
 
-"""
-        
-        status_emoji = {
-            TicketStatus.NEW: "🆕",
-            TicketStatus.NEEDS_INFO: "⏳",
-            TicketStatus.IN_PROGRESS: "🔧",
-            TicketStatus.DISPATCHED: "🚗",
-        }
-        
-        status_text = {
-            TicketStatus.NEW: "Pendiente",
-            TicketStatus.NEEDS_INFO: "Esperando información",
-            TicketStatus.IN_PROGRESS: "En proceso",
-            TicketStatus.DISPATCHED: "Técnico asignado",
-        }
+"""]
         
         for i, ticket in enumerate(open_tickets[:5], 1):
-            emoji = status_emoji.get(ticket.status, "📋")
-            status = status_text.get(ticket.status, ticket.status.value)
+            emoji = _STATUS_EMOJI.get(ticket.status, "📋")
+            status = _STATUS_TEXT_SHORT.get(ticket.status, ticket.status.value)
             subject_short = ticket.subject[:40] + "..." if len(ticket.subject) > 40 else ticket.subject
-            response += f"""{i}. {emoji} *{ticket.ticket_code}*
+            parts.append(f"""{i}. {emoji} *{ticket.ticket_code}*
    {subject_short}
    Estado: _{status}_
 
-"""
+""")
         
         if len(open_tickets) > 5:
-            response += f"_...y {len(open_tickets) - 5} más_\n\n"
+            parts.append(f"_...y {len(open_tickets) - 5} más_\n\n")
         
-        response += "Para más detalles de una incidencia, escribe su código (ej: INC-XXXXX)"
+        parts.append("Para más detalles de una incidencia, escribe su código (ej: INC-XXXXX)")
         
-        return response
+        return "".join(parts)
     
     def _format_ticket_status(self, ticket: Ticket) -> str:
         """Format detailed status for a single ticket."""
-        status_text = {
-            TicketStatus.NEW: "📋 Pendiente de asignación",
-            TicketStatus.NEEDS_INFO: "⏳ Esperando información adicional",
-            TicketStatus.IN_PROGRESS: "🔧 En proceso de reparación",
-            TicketStatus.DISPATCHED: "🚗 Técnico asignado",
-            TicketStatus.RESOLVED: "✅ Resuelta",
-            TicketStatus.CLOSED: "🔒 Cerrada",
-        }
-        
-        response = f"""📋 *Incidencia {ticket.ticket_code}*
+        parts = [f"""📋 *Incidencia {ticket.ticket_code}*
 
 📝 *Problema:* {ticket.subject}
 
-📊 *Estado:* {status_text.get(ticket.status, ticket.status.value)}
-"""
+📊 *Estado:* {_STATUS_TEXT_DETAIL.get(ticket.status, ticket.status.value)}
+"""]
         
         if ticket.address:
-            response += f"📍 *Ubicación:* {ticket.address}"
-            if ticket.location_detail:
-                response += f" ({ticket.location_detail})"
-            response += "\n"
+            location = f" ({ticket.location_detail})" if ticket.location_detail else ""
+            parts.append(f"📍 *Ubicación:* {ticket.address}{location}\n")
         
         if ticket.created_at:
             created_str = ticket.created_at.strftime("%d/%m/%Y %H:%M")
-            response += f"📅 *Reportada:* {created_str}\n"
+            parts.append(f"📅 *Reportada:* {created_str}\n")
         
         if ticket.status == TicketStatus.NEEDS_INFO:
-            response += "\n⚠️ _Necesitamos más información para procesar esta incidencia. Por favor revisa los datos que te solicitamos._"
+            parts.append("\n⚠️ _Necesitamos más información para procesar esta incidencia. Por favor revisa los datos que te solicitamos._")
         
-        return response
+        return "".join(parts)
     
     def _format_off_topic_response(self) -> str:
         """Response for off-topic questions."""
@@ -596,7 +998,7 @@ Puedo ayudarte a:
         pending_ticket: Optional[Ticket]
     ) -> str:
         """Format help message when intent is unclear."""
-        response = """🤔 No estoy seguro de entenderte. 
+        parts = ["""🤔 No estoy seguro de entenderte. 
 
 *¿Qué quieres hacer?*
 
@@ -604,90 +1006,77 @@ Puedo ayudarte a:
    _Ej: "La luz del portal no funciona"_
 
 2️⃣ *Ver mis incidencias* → Escribe "estado"
-"""
+"""]
         
         if pending_ticket:
-            response += f"""
+            parts.append(f"""
 ⚠️ *Tienes información pendiente de proporcionar* para la incidencia {pending_ticket.ticket_code}.
-"""
+""")
         
-        response += """
-Solo puedo ayudarte con incidencias del edificio (fontanería, electricidad, ascensores, limpieza, seguridad, etc.)"""
+        parts.append("""
+Solo puedo ayudarte con incidencias del edificio (fontanería, electricidad, ascensores, limpieza, seguridad, etc.)""")
         
-        return response
-    
-    def _is_new_incident_command(self, message: str) -> bool:
-        """Check if the message indicates a new incident should be created."""
-        message_lower = message.lower().strip()
-        
-        # Check exact matches or starts with (for short commands)
-        for cmd in NEW_INCIDENT_COMMANDS_EXACT:
-            if message_lower == cmd or message_lower.startswith(f"{cmd} ") or message_lower.startswith(f"{cmd}:"):
-                logger.info("New incident command detected (exact/start): '%s'", cmd)
-                return True
-        
-        # Check if any new incident phrase appears ANYWHERE in the message
-        for phrase in NEW_INCIDENT_PHRASES:
-            if phrase in message_lower:
-                logger.info("New incident phrase detected: '%s' in message", phrase)
-                return True
-        
-        return False
+        return "".join(parts)
     
     async def _detect_if_new_incident(self, existing_ticket: Ticket, new_message: str) -> Tuple[bool, str]:
         """
         Use AI to determine if the message is about a NEW incident or the same one.
         Returns (is_new_incident, reason).
         """
+        message_key = new_message.strip().lower()
+        if (
+            (len(message_key) < ACK_MAX_LEN or _ACK_RE.match(message_key))
+            and not _PROBLEM_KEYWORD_RE.search(message_key)
+            and not _CATEGORY_RE.search(message_key)
+            and not _NEW_INCIDENT_KEYWORD_RE.search(message_key)
+        ):
+            return False, "Respuesta breve sobre la misma incidencia"
+        
+        # Cheap keyword detection first; the LLM only settles ambiguous messages
+        is_new, reason = self._simple_new_incident_detection(existing_ticket, new_message)
+        if is_new:
+            logger.info("Keyword incident detection: is_new=%s, reason=%s", is_new, reason)
+            return is_new, reason
+        existing_category = existing_ticket.category.value if existing_ticket.category else ""
+        if (
+            len(message_key) < _RULE_TRUSTED_MAX_LEN
+            and {m.lastgroup for m in _CATEGORY_RE.finditer(message_key)} <= {existing_category}
+        ):
+            return False, "Respuesta corta sobre la misma incidencia"
+        
+        cache_key = (existing_ticket.id, str(existing_ticket.updated_at), message_key)
+        cached = _new_incident_cache.get(cache_key)
+        if cached:
+            _new_incident_cache.move_to_end(cache_key)
+            return cached
+        
         try:
-            # Build context about the existing ticket
-            existing_context = f"""
-INCIDENCIA EXISTENTE ({existing_ticket.ticket_code}):
-- Categoría: {existing_ticket.category.value if existing_ticket.category else 'No definida'}
-- Asunto: {existing_ticket.subject}
-- Descripción: {existing_ticket.description[:500] if existing_ticket.description else 'Sin descripción'}
-- Dirección: {existing_ticket.address or 'No especificada'}
-- Estado: {existing_ticket.status.value}
-"""
-            
-            # Get AI analysis
-            prompt = f"""Analiza si este nuevo mensaje de WhatsApp es sobre la MISMA incidencia existente o es una NUEVA incidencia diferente.
-
-{existing_context}
-
-NUEVO MENSAJE DEL USUARIO:
-"{new_message}"
-
-Criterios para considerarlo NUEVA incidencia:
-1. Habla de un problema DIFERENTE (ej: antes era fontanería, ahora electricidad)
-2. Menciona una ubicación DIFERENTE (otro piso, otro edificio)
-3. Describe algo claramente NO relacionado con lo anterior
-4. Usa frases como "tengo otro problema", "además", "otra cosa"
-
-Criterios para considerarlo la MISMA incidencia:
-1. Proporciona información que se pidió (nombre, dirección, detalles)
-2. Da más detalles sobre el MISMO problema
-3. Pregunta sobre el estado de su incidencia
-4. Responde a preguntas previas
-
-Responde ÚNICAMENTE en formato JSON: {{"is_new": true/false, "reason": "explicación breve"}}"""
+            # Get AI analysis (only the ticket context and message vary)
+            prompt = _NEW_INCIDENT_PROMPT_TMPL.format(
+                ticket_code=existing_ticket.ticket_code,
+                category=existing_ticket.category.value if existing_ticket.category else "No definida",
+                subject=existing_ticket.subject,
+                description=existing_ticket.description[:500] if existing_ticket.description else "Sin descripción",
+                address=existing_ticket.address or "No especificada",
+                status=existing_ticket.status.value,
+                new_message=new_message,
+            )
 
             if self.ai_agent.client:
-                response = await self.ai_agent.client.chat.completions.create(
-                    model=self.ai_agent.model,
-                    messages=[
-                        {"role": "system", "content": "Eres un asistente que analiza conversaciones de WhatsApp para determinar si un mensaje es sobre una nueva incidencia o la misma. Responde solo en JSON."},
-                        {"role": "user", "content": prompt},
-                    ],
-                    response_format={"type": "json_object"},
+                result = await self._classify_json(
+                    _NEW_INCIDENT_SYSTEM_PROMPT,
+                    prompt,
                     temperature=0.3,
+                    max_tokens=NEW_INCIDENT_MAX_TOKENS,
+                    response_format=_NEW_INCIDENT_RESPONSE_FORMAT,
                 )
-                
-                result = json.loads(response.choices[0].message.content)
                 is_new = result.get("is_new", False)
                 reason = result.get("reason", "Sin razón especificada")
                 
                 logger.info("AI incident detection: is_new=%s, reason=%s", is_new, reason)
+                _new_incident_cache[cache_key] = (is_new, reason)
+                if len(_new_incident_cache) > _NEW_INCIDENT_CACHE_SIZE:
+                    _new_incident_cache.popitem(last=False)
                 return is_new, reason
             
             # Fallback: simple keyword detection
@@ -701,34 +1090,21 @@ Responde ÚNICAMENTE en formato JSON: {{"is_new": true/false, "reason": "explica
         """Simple keyword-based detection as fallback."""
         message_lower = new_message.lower()
         
-        # Keywords that suggest a new incident
-        new_incident_keywords = [
-            "otro problema", "otra incidencia", "además tengo", "también tengo",
-            "nueva avería", "otra avería", "otro tema", "aparte de eso",
-            "tengo otro", "hay otro", "también hay", "otro asunto",
-        ]
+        # Single scan: new-incident keywords plus the categories mentioned
+        signals = {}
+        for match in _INCIDENT_SIGNAL_RE.finditer(message_lower):
+            signals.setdefault(match.lastgroup, match.group())
         
-        for keyword in new_incident_keywords:
-            if keyword in message_lower:
-                return True, f"Contiene '{keyword}'"
+        # Keywords that suggest a new incident
+        keyword = signals.pop("new_incident", None)
+        if keyword:
+            return True, f"Contiene '{keyword}'"
         
         # Check if message mentions a completely different category
         existing_category = existing_ticket.category.value if existing_ticket.category else ""
-        category_keywords = {
-            "plumbing": ["agua", "tubería", "fontanería", "grifo", "lavabo", "wc", "atasco", "fuga"],
-            "electrical": ["luz", "electricidad", "enchufe", "interruptor", "corriente", "fusible"],
-            "elevator": ["ascensor", "elevador"],
-            "structural": ["grieta", "pared", "techo", "suelo", "estructura"],
-            "cleaning": ["limpieza", "basura", "suciedad"],
-            "security": ["seguridad", "puerta", "cerradura", "portal"],
-        }
         
         # Find what category the new message might be about
-        new_categories = set()
-        for cat, keywords in category_keywords.items():
-            for kw in keywords:
-                if kw in message_lower:
-                    new_categories.add(cat)
+        new_categories = set(signals)
         
         # If new message is about a different category, it's likely a new incident
         if new_categories and existing_category not in new_categories:
@@ -736,17 +1112,15 @@ Responde ÚNICAMENTE en formato JSON: {{"is_new": true/false, "reason": "explica
         
         return False, "Parece ser sobre la misma incidencia"
     
-    async def _add_update_to_ticket(self, ticket: Ticket, message: str, phone: str) -> str:
+    def _add_update_to_ticket(self, ticket: Ticket, message: str, phone: str) -> str:
         """Add a message as an update to an existing ticket."""
-        # Create event
-        event = Event(
-            ticket_id=ticket.id,
-            event_type="whatsapp_update",
-            description=f"Mensaje adicional recibido vía WhatsApp: {message[:200]}",
-            metadata={"phone": phone, "message": message},
-        )
-        self.db.add(event)
-        await self.db.commit()
+        # The event is informational only, so it is written off the response path
+        spawn_background(_persist_event_background({
+            "ticket_id": ticket.id,
+            "event_type": "whatsapp_update",
+            "description": f"Mensaje adicional recibido vía WhatsApp: {message[:200]}",
+            "payload": {"phone": phone, "message": message},
+        }))
         
         response = f"""📝 *Mensaje recibido*
 
@@ -762,307 +1136,355 @@ Si tienes dudas sobre esta incidencia, simplemente responde aquí."""
     
     def _get_status_text(self, status: TicketStatus) -> str:
         """Get user-friendly status text."""
-        status_texts = {
-            TicketStatus.NEW: "Nueva - Pendiente de asignación",
-            TicketStatus.NEEDS_INFO: "Esperando información",
-            TicketStatus.IN_PROGRESS: "En proceso",
-            TicketStatus.DISPATCHED: "Asignada a proveedor",
-            TicketStatus.RESOLVED: "Resuelta",
-            TicketStatus.CLOSED: "Cerrada",
-        }
-        return status_texts.get(status, status.value)
-    
-    async def _find_ticket_by_phone(self, phone: str) -> Optional[Ticket]:
-        """Find the most recent open ticket for this phone number."""
-        result = await self.db.execute(
-            select(Ticket)
-            .where(
-                Ticket.reporter_phone == phone,
-                Ticket.status.in_([
-                    TicketStatus.NEW,
-                    TicketStatus.NEEDS_INFO,
-                    TicketStatus.IN_PROGRESS,
-                    TicketStatus.DISPATCHED,
-                ])
-            )
-            .order_by(Ticket.created_at.desc())
-            .limit(1)
-        )
-        return result.scalar_one_or_none()
+        return _STATUS_TEXT.get(status, status.value)
     
     async def _find_or_create_reporter(
         self,
         phone: str,
         name: Optional[str] = None,
+        reporter: Optional[Reporter] = None,
+        placeholder_email: Optional[str] = None,
     ) -> Optional[Reporter]:
-        """Find or create a reporter by phone number."""
-        # Normalize phone - remove spaces, dashes, and ensure consistent format
-        phone_clean = phone.strip().replace(" ", "").replace("-", "")
-        
-        # Also try variations without + or with different prefix
-        phone_variants = [
-            phone_clean,
-            phone_clean.replace("+", ""),
-            f"+{phone_clean}" if not phone_clean.startswith("+") else phone_clean,
-        ]
-        
-        # Check if this phone belongs to a provider
-        for variant in phone_variants:
-            provider_check = await self.db.execute(
-                select(Provider).where(
-                    (Provider.phone == variant) | 
-                    (Provider.phone_emergency == variant)
-                )
-            )
-            if provider_check.scalar_one_or_none():
-                logger.info("Phone %s belongs to a provider, skipping reporter creation", phone_clean)
-                return None
+        """
+        Find or create a reporter by phone number (reuses an already loaded one).
+        A new reporter is only flushed; the caller commits it with the ticket.
+        """
+        if reporter:
+            return reporter
         
-        # Try to find existing reporter by phone (try all variants)
-        reporter = None
-        for variant in phone_variants:
-            result = await self.db.execute(
-                select(Reporter).where(Reporter.phone == variant)
-            )
-            reporter = result.scalar_one_or_none()
-            if reporter:
-                break
+        # Normalize phone (first variant) and also try variations without + or
+        # with different prefix
+        phone_variants = _phone_variants(phone)
+        phone_clean = phone_variants[0]
+        
+        # Check if this phone belongs to a provider and look up the reporter
+        # (all variants at once) in one round trip; the one-row anchor returns
+        # the provider flag even when there is no reporter. populate_existing
+        # reloads a cached instance with the latest data
+        is_provider = exists().where(
+            Provider.phone.in_(phone_variants) |
+            Provider.phone_emergency.in_(phone_variants)
+        )
+        anchor = select(literal(1).label("anchor")).subquery()
+        result = await self.db.execute(
+            select(is_provider.label("is_provider"), Reporter)
+            .select_from(anchor)
+            .outerjoin(Reporter, Reporter.phone.in_(phone_variants))
+            .limit(1)
+            .execution_options(populate_existing=True)
+        )
+        belongs_to_provider, reporter = result.one()
+        if belongs_to_provider:
+            logger.info("Phone %s belongs to a provider, skipping reporter creation", phone_clean)
+            return None
         
         if reporter:
-            # Refresh to get latest data from database
-            await self.db.refresh(reporter)
             logger.info("Found existing reporter by phone: %s (refreshed)", reporter.name)
             return reporter
         
-        # Generate placeholder email from phone
-        phone_for_email = phone_clean.replace("+", "").replace(" ", "").replace("-", "")
-        placeholder_email = f"whatsapp_{phone_for_email}@wa.placeholder.com"
-        
         # Create new reporter
         reporter = Reporter(
-            name=name or f"WhatsApp {phone_clean[-4:]}",
-            email=placeholder_email,
+            name=name or _placeholder_name(phone_clean),
+            email=placeholder_email or _placeholder_email(phone_clean),
             phone=phone_clean,
             is_active=True,
             preferred_contact_method="whatsapp",
         )
         self.db.add(reporter)
-        await self.db.commit()
-        await self.db.refresh(reporter)
+        await self.db.flush()
         
         logger.info("Created new reporter from WhatsApp: %s", phone_clean)
         return reporter
     
+    async def _merge_reporter_info(
+        self,
+        reporter: Reporter,
+        address: Optional[str] = None,
+        floor_door: Optional[str] = None,
+        name: Optional[str] = None,
+    ) -> None:
+        """
+        Fill the reporter's empty fields with newly extracted data.
+        
+        The merge runs as a single UPDATE so two messages from the same phone
+        can't overwrite each other's data (no read-modify-write); the loaded
+        instance is refreshed from RETURNING. floor_door must be sanitized.
+        """
+        # An existing floor_door that is really a room name ("baño") is replaced
+        invalid_floor_door = None
+        if reporter.floor_door and not _sanitize_floor_door(reporter.floor_door):
+            logger.info("Clearing invalid floor_door value: %s", reporter.floor_door)
+            invalid_floor_door = reporter.floor_door
+        
+        values = {}
+        if address:
+            values["address"] = func.coalesce(Reporter.address, address)
+        if floor_door or invalid_floor_door:
+            floor_door_free = Reporter.floor_door.is_(None)
+            if invalid_floor_door:
+                floor_door_free = floor_door_free | (Reporter.floor_door == invalid_floor_door)
+            values["floor_door"] = case((floor_door_free, floor_door), else_=Reporter.floor_door)
+        if name:
+            values["name"] = case((Reporter.name.startswith(PLACEHOLDER_NAME_PREFIX), name), else_=Reporter.name)
+        if not values:
+            return
+        
+        # Consuming the RETURNING row is what refreshes the loaded instance
+        result = await self.db.execute(
+            update(Reporter)
+            .where(Reporter.id == reporter.id)
+            .values(**values)
+            .returning(Reporter)
+            .execution_options(synchronize_session=False, populate_existing=True)
+        )
+        result.scalars().one()
+    
     async def _create_ticket_from_message(
         self,
         phone: str,
         message: str,
         profile_name: Optional[str] = None,
+        reporter: Optional[Reporter] = None,
     ) -> str:
         """Create a new ticket from a WhatsApp message."""
-        # Find or create reporter
-        reporter = await self._find_or_create_reporter(phone, profile_name)
-        
-        # Log reporter data for debugging
-        if reporter:
-            logger.info("Reporter found: name=%s, phone=%s, address=%s, floor_door=%s, community=%s",
-                       reporter.name, reporter.phone, reporter.address, reporter.floor_door, reporter.community_name)
-        
-        # Use AI to analyze the incident
+        # Use AI to analyze the incident (before any write, so no DB
+        # connection is held during the call)
         analysis = await self.ai_agent.analyze_incident(
             subject="Incidencia vía WhatsApp",
             body=message,
             sender_email=None,
-            sender_name=profile_name or reporter.name if reporter else None,
+            sender_name=profile_name or (reporter.name if reporter else None),
             conversation_history=[],
         )
         
-        logger.info("AI Analysis - Complete: %s, Category: %s, Missing: %s",
-                   analysis.has_complete_info, analysis.category, analysis.missing_fields)
-        logger.info("AI Extracted info: %s", analysis.extracted_info)
+        # Placeholder email (required by schema) shared by a new reporter and
+        # the ticket when no real email is known
+        placeholder_email = _placeholder_email(phone)
+        
+        # Find or create reporter
+        reporter = await self._find_or_create_reporter(
+            phone, profile_name, reporter, placeholder_email=placeholder_email
+        )
+        
+        # Log reporter data for debugging
+        if reporter:
+            logger.debug("Reporter found: name=%s, phone=%s, address=%s, floor_door=%s, community=%s",
+                        reporter.name, reporter.phone, reporter.address, reporter.floor_door, reporter.community_name)
+        
+        logger.debug("AI Analysis - Complete: %s, Category: %s, Missing: %s",
+                    analysis.has_complete_info, analysis.category, analysis.missing_fields)
+        logger.debug("AI Extracted info: %s", analysis.extracted_info)
         
         # Determine category and priority
         category = analysis.category or Category.OTHER
         priority = analysis.priority or Priority.MEDIUM
         
         # Pre-fill from reporter if available - ONLY use clean data, not AI extractions on floor_door
-        reporter_name = profile_name or (reporter.name if reporter else f"WhatsApp {phone[-4:]}")
+        reporter_name = profile_name or (reporter.name if reporter else _placeholder_name(phone))
         community = reporter.community_name if reporter else None
         address = reporter.address if reporter else None
         # Only use floor_door if it looks like a real floor/door (not a room name like "baño")
-        floor_door = None
-        if reporter and reporter.floor_door:
-            fd_lower = reporter.floor_door.lower()
-            # Filter out room names that got incorrectly saved as floor_door
-            invalid_floor_door = ["baño", "bano", "cocina", "salon", "salón", "dormitorio", "habitacion", "habitación", "terraza", "balcon", "balcón", "pasillo"]
-            if not any(room in fd_lower for room in invalid_floor_door):
-                floor_door = reporter.floor_door
-            else:
-                logger.warning("Skipping invalid floor_door value: %s", reporter.floor_door)
+        floor_door = _sanitize_floor_door(reporter.floor_door) if reporter else None
+        if reporter and reporter.floor_door and not floor_door:
+            logger.warning("Skipping invalid floor_door value: %s", reporter.floor_door)
         
-        reporter_email = reporter.email if reporter and reporter.email else None
+        reporter_email = reporter.email if reporter and reporter.email else placeholder_email
         
-        # Generate placeholder email if none available (required by schema)
-        if not reporter_email:
-            # Create email from phone: +34612345678 -> whatsapp_34612345678@wa.placeholder.com
-            phone_clean = phone.replace("+", "").replace(" ", "").replace("-", "")
-            reporter_email = f"whatsapp_{phone_clean}@wa.placeholder.com"
+        # Determine if we have enough info to proceed
+        # Essential: phone + problem description + (address OR community)
+        has_essential = (
+            phone and
+            message and len(message.strip()) > 10 and
+            (address or community)
+        )
         
-        # Create ticket
-        ticket_service = TicketService(self.db)
+        # If AI says complete OR we have essential info, proceed (status NEW, ready for provider)
+        should_proceed = analysis.has_complete_info or has_essential
         
         # Generate a clean subject from AI summary or extract from message
         subject = self._generate_clean_subject(message, analysis.summary)
         
-        ticket = await ticket_service.create_ticket(TicketCreate(
-            subject=subject,
-            description=message,
-            category=category,
-            priority=priority,
-            reporter_email=reporter_email,
-            reporter_name=reporter_name,
-            community_name=community,
-        ))
-        
-        # Set additional fields not in schema
-        ticket.reporter_phone = phone
-        ticket.address = address
-        ticket.location_detail = floor_door
-        ticket.channel = Channel.WHATSAPP  # Mark as WhatsApp channel
-        
-        # Set status and AI context
-        initial_status = TicketStatus.NEW if analysis.has_complete_info else TicketStatus.NEEDS_INFO
-        ticket.status = initial_status
-        ticket.ai_context = {
-            "analysis": {
-                "has_complete_info": analysis.has_complete_info,
-                "category": analysis.category.value if analysis.category else None,
-                "priority": analysis.priority.value if analysis.priority else None,
-                "missing_fields": analysis.missing_fields,
-                "extracted_info": analysis.extracted_info,
-                "summary": analysis.summary,
+        # The ticket is inserted with all its fields and committed below,
+        # together with a new reporter and the reporter updates
+        ticket = await self.ticket_service.create_ticket(
+            TicketCreate(
+                subject=subject,
+                description=message,
+                category=category,
+                priority=priority,
+                reporter_email=reporter_email,
+                reporter_name=reporter_name,
+                reporter_phone=phone,
+                community_name=community,
+                address=address,
+                location_detail=floor_door,
+            ),
+            status=TicketStatus.NEW if should_proceed else TicketStatus.NEEDS_INFO,
+            ai_context={
+                "analysis": {
+                    "has_complete_info": analysis.has_complete_info,
+                    "category": analysis.category.value if analysis.category else None,
+                    "priority": analysis.priority.value if analysis.priority else None,
+                    "missing_fields": analysis.missing_fields,
+                    "extracted_info": analysis.extracted_info,
+                    "summary": analysis.summary,
+                },
+                "source": "whatsapp",
+                "conversation_history": [
+                    {"role": "user", "content": message}
+                ],
             },
-            "source": "whatsapp",
-            "conversation_history": [
-                {"role": "user", "content": message}
-            ],
-        }
+            channel=Channel.WHATSAPP,
+            commit=False,
+        )
         
         # Update reporter with extracted info (but be careful with floor_door)
         if reporter:
             extracted = analysis.extracted_info
-            if extracted.get("address") and not reporter.address:
-                reporter.address = extracted["address"]
             # Only save location_detail as floor_door if it looks like actual floor/door info
-            if extracted.get("location_detail") and not reporter.floor_door:
-                location = extracted["location_detail"].lower()
-                invalid_locations = ["baño", "bano", "cocina", "salon", "salón", "dormitorio", 
-                                    "habitacion", "habitación", "terraza", "balcon", "balcón", "pasillo"]
-                if not any(room in location for room in invalid_locations):
-                    reporter.floor_door = extracted["location_detail"]
-                    logger.info("Saved floor_door: %s", extracted["location_detail"])
-                else:
-                    logger.warning("Not saving room name as floor_door: %s", extracted["location_detail"])
-            if extracted.get("reporter_name") and reporter.name.startswith("WhatsApp"):
-                reporter.name = extracted["reporter_name"]
-            
-            # Clean up existing invalid floor_door value
-            if reporter.floor_door:
-                fd_lower = reporter.floor_door.lower()
-                invalid_floor_door = ["baño", "bano", "cocina", "salon", "salón", "dormitorio", 
-                                     "habitacion", "habitación", "terraza", "balcon", "balcón", "pasillo"]
-                if any(room in fd_lower for room in invalid_floor_door):
-                    logger.info("Clearing invalid floor_door value: %s", reporter.floor_door)
-                    reporter.floor_door = None
-        
-        await self.db.commit()
-        await self.db.refresh(ticket)
-        
-        logger.info("Created ticket %s from WhatsApp", ticket.ticket_code)
+            location_detail = _sanitize_floor_door(extracted.get("location_detail"))
+            if extracted.get("location_detail") and not location_detail:
+                logger.warning("Not saving room name as floor_door: %s", extracted["location_detail"])
+            await self._merge_reporter_info(
+                reporter,
+                address=extracted.get("address"),
+                floor_door=location_detail,
+                name=extracted.get("reporter_name"),
+            )
         
-        # Create event
-        event = Event(
-            ticket_id=ticket.id,
-            event_type="whatsapp_received",
-            description=f"Incidencia recibida vía WhatsApp desde {phone}",
-            metadata={"phone": phone, "message_preview": message[:100]},
-        )
-        self.db.add(event)
         await self.db.commit()
         
-        # Determine if we have enough info to proceed
-        # Essential: phone + problem description + (address OR community)
-        has_essential = (
-            phone and
-            message and len(message.strip()) > 10 and
-            (address or community)
-        )
+        # The event is informational only, so it is written off the response path
+        spawn_background(_persist_event_background({
+            "ticket_id": ticket.id,
+            "event_type": "whatsapp_received",
+            "description": f"Incidencia recibida vía WhatsApp desde {phone}",
+            "payload": {"phone": phone, "message_preview": message[:100]},
+        }))
         
-        # If AI says complete OR we have essential info, proceed
-        should_proceed = analysis.has_complete_info or has_essential
+        logger.info("Created ticket %s from WhatsApp (category=%s, complete_info=%s)",
+                    ticket.ticket_code, category.value, analysis.has_complete_info)
         
         if should_proceed:
-            # Update status to NEW (ready for provider)
-            if ticket.status == TicketStatus.NEEDS_INFO:
-                ticket.status = TicketStatus.NEW
-                await self.db.commit()
-            await self._notify_default_provider(ticket)
+            self._notify_default_provider(ticket)
             return self._format_complete_response(ticket, analysis)
         else:
             # Pass reporter info to format response with known data
-            known_data = {
-                "name": reporter_name if not reporter_name.startswith("WhatsApp") else None,
-                "phone": phone,
-                "community": community,
-                "address": address,
-                "floor_door": floor_door,
-            }
+            known_data = self._build_known_data(
+                name=reporter_name,
+                phone=phone,
+                community=community,
+                address=address,
+                floor_door=floor_door,
+            )
             return self._format_followup_response(ticket, analysis, known_data)
     
+    @staticmethod
+    def _quick_analysis(ticket: Ticket, message: str) -> Optional[IncidentAnalysis]:
+        """
+        Build the analysis locally when a short reply supplies every field the
+        previous analysis was missing (e.g. "3º A" for location_detail), or
+        is just an acknowledgement ("sí", "gracias") to a ticket that already
+        had complete info. Returns None when the reply needs the full AI
+        analysis (a "sí" confirming the known data can complete a NEEDS_INFO
+        ticket, so those still go to the AI).
+        """
+        previous = (ticket.ai_context or {}).get("analysis") or {}
+        missing_fields = previous.get("missing_fields") or []
+        if (
+            previous.get("has_complete_info")
+            and ticket.status != TicketStatus.NEEDS_INFO
+            and _BARE_ACK_RE.fullmatch(message.strip().lower())
+        ):
+            return IncidentAnalysis(
+                has_complete_info=True,
+                category=ticket.category,
+                priority=ticket.priority,
+                missing_fields=list(missing_fields),
+                extracted_info=dict(previous.get("extracted_info") or {}),
+                follow_up_questions=[],
+                summary=previous.get("summary") or ticket.subject,
+            )
+        if not missing_fields or len(message) > QUICK_REPLY_MAX_LEN:
+            return None
+        
+        extracted = {}
+        for field in missing_fields:
+            attr = _FIELD_TICKET_ATTRS.get(field)
+            if attr and getattr(ticket, attr):
+                continue
+            extractor = _QUICK_FIELD_EXTRACTORS.get(field)
+            match = extractor[1].search(message) if extractor else None
+            if not match:
+                return None
+            extracted[extractor[0]] = match.group().strip()
+        
+        if not extracted:
+            return None
+        return IncidentAnalysis(
+            has_complete_info=True,
+            category=ticket.category,
+            priority=ticket.priority,
+            missing_fields=[],
+            extracted_info={**(previous.get("extracted_info") or {}), **extracted},
+            follow_up_questions=[],
+            summary=previous.get("summary") or ticket.subject,
+        )
+    
     async def _process_info_response(
         self,
         ticket: Ticket,
         message: str,
         phone: str,
+        reporter: Optional[Reporter] = None,
     ) -> str:
         """Process a response to a follow-up question."""
         logger.info("Processing info response for ticket %s", ticket.ticket_code)
         
-        # Get conversation history
-        ai_context = ticket.ai_context or {}
-        conversation_history = ai_context.get("conversation_history", [])
+        # Get conversation history (ai_context is a MutableDict, edited in place)
+        if ticket.ai_context is None:
+            ticket.ai_context = {}
+        ai_context = ticket.ai_context
+        conversation_history = ai_context.setdefault("conversation_history", [])
         conversation_history.append({"role": "user", "content": message})
+        # Keep the stored history bounded; the oldest turns are dropped
+        del conversation_history[:-MAX_STORED_HISTORY_MESSAGES]
+        
+        # A short answer with exactly the data we asked for (or a bare
+        # acknowledgement) skips the AI
+        analysis = self._quick_analysis(ticket, message)
+        if analysis:
+            logger.info("Reply to %s needs no AI re-analysis", ticket.ticket_code)
+        else:
+            # Build context with existing ticket data so AI knows what we already have
+            existing_info = []
+            if ticket.reporter_name:
+                existing_info.append(f"Nombre: {ticket.reporter_name}")
+            if ticket.reporter_phone:
+                existing_info.append(f"Teléfono: {ticket.reporter_phone}")
+            if ticket.address:
+                existing_info.append(f"Dirección: {ticket.address}")
+            if ticket.location_detail:
+                existing_info.append(f"Piso/Puerta: {ticket.location_detail}")
+            if ticket.community_name:
+                existing_info.append(f"Comunidad: {ticket.community_name}")
+            
+            # Build full context for AI
+            full_body = ticket.description or ""
+            if existing_info:
+                full_body += f"\n\n[INFORMACIÓN YA RECOPILADA]\n" + "\n".join(existing_info)
+            full_body += f"\n\n[NUEVA RESPUESTA DEL USUARIO]\n{message}"
+            
+            # Re-analyze with new info
+            analysis = await self.ai_agent.analyze_incident(
+                subject=ticket.subject,
+                body=full_body,
+                sender_email=ticket.reporter_email,
+                sender_name=ticket.reporter_name,
+                conversation_history=conversation_history,
+            )
         
-        # Build context with existing ticket data so AI knows what we already have
-        existing_info = []
-        if ticket.reporter_name:
-            existing_info.append(f"Nombre: {ticket.reporter_name}")
-        if ticket.reporter_phone:
-            existing_info.append(f"Teléfono: {ticket.reporter_phone}")
-        if ticket.address:
-            existing_info.append(f"Dirección: {ticket.address}")
-        if ticket.location_detail:
-            existing_info.append(f"Piso/Puerta: {ticket.location_detail}")
-        if ticket.community_name:
-            existing_info.append(f"Comunidad: {ticket.community_name}")
-        
-        # Build full context for AI
-        full_body = ticket.description or ""
-        if existing_info:
-            full_body += f"\n\n[INFORMACIÓN YA RECOPILADA]\n" + "\n".join(existing_info)
-        full_body += f"\n\n[NUEVA RESPUESTA DEL USUARIO]\n{message}"
-        
-        # Re-analyze with new info
-        analysis = await self.ai_agent.analyze_incident(
-            subject=ticket.subject,
-            body=full_body,
-            sender_email=ticket.reporter_email,
-            sender_name=ticket.reporter_name,
-            conversation_history=conversation_history,
-        )
-        
-        # Update ticket with conversation history
-        ai_context["conversation_history"] = conversation_history
+        # Store the new analysis next to the conversation history
         ai_context["analysis"] = {
             "has_complete_info": analysis.has_complete_info,
             "category": analysis.category.value if analysis.category else None,
@@ -1071,62 +1493,26 @@ Si tienes dudas sobre esta incidencia, simplemente responde aquí."""
             "extracted_info": analysis.extracted_info,
             "summary": analysis.summary,
         }
-        ticket.ai_context = ai_context
-        
-        # Update extracted info from the new response
-        extracted = analysis.extracted_info
-        if extracted.get("address") and not ticket.address:
-            ticket.address = extracted["address"]
-        # Only save location_detail if it looks like actual floor/door info
-        if extracted.get("location_detail") and not ticket.location_detail:
-            location = extracted["location_detail"].lower()
-            invalid_locations = ["baño", "bano", "cocina", "salon", "salón", "dormitorio", 
-                                "habitacion", "habitación", "terraza", "balcon", "balcón", "pasillo"]
-            if not any(room in location for room in invalid_locations):
-                ticket.location_detail = extracted["location_detail"]
-        if extracted.get("reporter_phone") and not ticket.reporter_phone:
-            ticket.reporter_phone = extracted["reporter_phone"]
-        if extracted.get("reporter_name") and (not ticket.reporter_name or ticket.reporter_name.startswith("WhatsApp")):
-            ticket.reporter_name = extracted["reporter_name"]
-        
-        # Also update reporter record if available
-        reporter = None
-        phone_clean = phone.strip()
-        result = await self.db.execute(
-            select(Reporter).where(Reporter.phone == phone_clean)
-        )
-        reporter = result.scalar_one_or_none()
         
+        # Update extracted info from the new response (empty fields only)
+        extracted = {
+            key: sanitize(extracted_value) if sanitize else extracted_value
+            for key, sanitize in _EXTRACTED_FIELD_SANITIZERS.items()
+            if (extracted_value := analysis.extracted_info.get(key))
+        }
+        for key, value in extracted.items():
+            current = getattr(ticket, key)
+            if value and (not current or key == "reporter_name" and _is_placeholder_name(current)):
+                setattr(ticket, key, value)
+        
+        # Also update reporter record if available (loaded with the user context)
         if reporter:
-            if extracted.get("address") and not reporter.address:
-                reporter.address = extracted["address"]
-            # Only save location_detail as floor_door if it looks like actual floor/door info
-            if extracted.get("location_detail") and not reporter.floor_door:
-                location = extracted["location_detail"].lower()
-                invalid_locations = ["baño", "bano", "cocina", "salon", "salón", "dormitorio", 
-                                    "habitacion", "habitación", "terraza", "balcon", "balcón", "pasillo"]
-                if not any(room in location for room in invalid_locations):
-                    reporter.floor_door = extracted["location_detail"]
-            if extracted.get("reporter_name") and reporter.name.startswith("WhatsApp"):
-                reporter.name = extracted["reporter_name"]
-            
-            # Clean up existing invalid floor_door value
-            if reporter.floor_door:
-                fd_lower = reporter.floor_door.lower()
-                invalid_floor_door = ["baño", "bano", "cocina", "salon", "salón", "dormitorio", 
-                                     "habitacion", "habitación", "terraza", "balcon", "balcón", "pasillo"]
-                if any(room in fd_lower for room in invalid_floor_door):
-                    logger.info("Clearing invalid floor_door value in _process_info_response: %s", reporter.floor_door)
-                    reporter.floor_door = None
-        
-        # Create event
-        event = Event(
-            ticket_id=ticket.id,
-            event_type="whatsapp_response",
-            description=f"Respuesta recibida vía WhatsApp",
-            metadata={"message_preview": message[:100]},
-        )
-        self.db.add(event)
+            await self._merge_reporter_info(
+                reporter,
+                address=extracted.get("address"),
+                floor_door=extracted.get("location_detail"),
+                name=extracted.get("reporter_name"),
+            )
         
         # Count number of user interactions
         user_messages = [m for m in conversation_history if m.get("role") == "user"]
@@ -1145,37 +1531,35 @@ Si tienes dudas sobre esta incidencia, simplemente responde aquí."""
         
         if should_proceed:
             ticket.status = TicketStatus.NEW
-            await self.db.commit()
-            await self._notify_default_provider(ticket)
+        # Ticket and reporter changes go out in one transaction
+        await self.db.commit()
+        
+        # The event is informational only, so it is written off the response path
+        spawn_background(_persist_event_background({
+            "ticket_id": ticket.id,
+            "event_type": "whatsapp_response",
+            "description": "Respuesta recibida vía WhatsApp",
+            "payload": {"message_preview": message[:100]},
+        }))
+        
+        if should_proceed:
+            self._notify_default_provider(ticket)
             return self._format_complete_response(ticket, analysis)
         else:
-            await self.db.commit()
-            # Build known data from ticket (filter out invalid floor_door values)
-            floor_door_value = ticket.location_detail
-            if floor_door_value:
-                fd_lower = floor_door_value.lower()
-                invalid_values = ["baño", "bano", "cocina", "salon", "salón", "dormitorio", 
-                                 "habitacion", "habitación", "terraza", "balcon", "balcón", "pasillo"]
-                if any(room in fd_lower for room in invalid_values):
-                    floor_door_value = None
-            
-            known_data = {
-                "name": ticket.reporter_name if ticket.reporter_name and not ticket.reporter_name.startswith("WhatsApp") else None,
-                "phone": ticket.reporter_phone,
-                "community": ticket.community_name,
-                "address": ticket.address,
-                "floor_door": floor_door_value,
-            }
+            # Build known data from ticket
+            known_data = self._build_known_data(
+                name=ticket.reporter_name,
+                phone=ticket.reporter_phone,
+                community=ticket.community_name,
+                address=ticket.address,
+                floor_door=ticket.location_detail,
+            )
             return self._format_followup_response(ticket, analysis, known_data)
     
-    async def _notify_default_provider(self, ticket: Ticket) -> None:
-        """Notify the default provider for this ticket category."""
-        try:
-            from app.services.email_service import EmailService
-            email_service = EmailService(self.db)
-            await email_service._notify_default_provider(ticket)
-        except Exception as e:
-            logger.error("Failed to notify provider: %s", str(e))
+    def _notify_default_provider(self, ticket: Ticket) -> None:
+        """Notify the default provider for this ticket category (in the background)."""
+        # The provider email can take seconds; don't hold the webhook reply for it
+        spawn_background(_notify_default_provider_background(ticket.id))
     
     # Mapping from technical field names to user-friendly Spanish
     FIELD_NAMES_ES = {
@@ -1190,137 +1574,112 @@ Si tienes dudas sobre esta incidencia, simplemente responde aquí."""
         "category": "Tipo de incidencia",
     }
     
+    # Category names shown to the user
+    CATEGORY_NAMES_ES = {
+        "plumbing": "Fontanería",
+        "electrical": "Electricidad",
+        "elevator": "Ascensor",
+        "structural": "Estructura/Albañilería",
+        "cleaning": "Limpieza",
+        "security": "Seguridad",
+        "hvac": "Climatización",
+        "other": "General",
+    }
+    
+    # Friendly name and example for the fields asked in follow-ups
+    FIELD_EXAMPLES_ES = {
+        "reporter_name": ("Su nombre completo", "Ej: Juan García"),
+        "address": ("Dirección del edificio", "Ej: Calle Mayor 15"),
+        "location_detail": ("Piso y puerta", "Ej: 3º A"),
+    }
+    
+    # Fields still worth asking for once phone and problem are known
+    ESSENTIAL_FOLLOWUP_FIELDS = frozenset({"address", "location_detail", "reporter_name"})
+    
+    @staticmethod
+    def _build_known_data(
+        *,
+        name: Optional[str],
+        phone: Optional[str],
+        community: Optional[str],
+        address: Optional[str],
+        floor_door: Optional[str],
+    ) -> dict:
+        """Build the known data shown in follow-up replies (drops placeholder names and room names)."""
+        return {
+            "name": name if name and not _is_placeholder_name(name) else None,
+            "phone": phone,
+            "community": community,
+            "address": address,
+            "floor_door": _sanitize_floor_door(floor_door),
+        }
+    
     def _format_complete_response(self, ticket: Ticket, analysis) -> str:
         """Format response when ticket has complete info."""
         # Get category in Spanish
-        category_names = {
-            "plumbing": "Fontanería",
-            "electrical": "Electricidad",
-            "elevator": "Ascensor",
-            "structural": "Estructura/Albañilería",
-            "cleaning": "Limpieza",
-            "security": "Seguridad",
-            "hvac": "Climatización",
-            "other": "General",
-        }
-        category_es = category_names.get(ticket.category.value, ticket.category.value) if ticket.category else "General"
-        
-        response = f"""✅ *INCIDENCIA REGISTRADA CORRECTAMENTE*
-
-📋 *Código de seguimiento:* {ticket.ticket_code}
-
-📝 *Resumen del problema:*
-{analysis.summary}
-
-🏷️ *Categoría:* {category_es}
-"""
+        category_es = self.CATEGORY_NAMES_ES.get(ticket.category.value, ticket.category.value) if ticket.category else "General"
         
         # Add location info if available
+        location = ""
         if ticket.address:
-            response += f"📍 *Ubicación:* {ticket.address}"
-            if ticket.location_detail:
-                response += f" ({ticket.location_detail})"
-            response += "\n"
-        
-        response += f"""
-━━━━━━━━━━━━━━━━━━━━━━
-✔️ Hemos notificado al técnico especializado.
-
-� *Le informaremos cuando la incidencia esté solucionada.*
-
-💾 *Guarde el código {ticket.ticket_code}* para consultar el estado de su incidencia.
-
-Si tiene alguna duda, responda a este mensaje."""
-        
-        return response
+            location_detail = f" ({ticket.location_detail})" if ticket.location_detail else ""
+            location = f"📍 *Ubicación:* {ticket.address}{location_detail}\n"
+        
+        return _COMPLETE_RESPONSE_TMPL.format(
+            ticket_code=ticket.ticket_code,
+            summary=analysis.summary,
+            category=category_es,
+            location=location,
+        )
     
     def _format_followup_response(self, ticket: Ticket, analysis, known_data: dict = None) -> str:
         """Format response asking for more info, showing known data first."""
         known_data = known_data or {}
         
-        response = f"""📋 *INCIDENCIA RECIBIDA*
-Código: *{ticket.ticket_code}*
-
-"""
+        parts = [_FOLLOWUP_HEADER_TMPL.format(ticket_code=ticket.ticket_code)]
         
         # Show summary of what we understood about the problem
         if analysis.summary:
-            response += f"""📝 *Hemos entendido que su problema es:*
-"{analysis.summary}"
-
-"""
+            parts.append(_FOLLOWUP_SUMMARY_TMPL.format(summary=analysis.summary))
         
-        # Show known data for confirmation
-        known_items = []
-        if known_data.get("name"):
-            known_items.append(f"👤 Nombre: {known_data['name']}")
-        if known_data.get("phone"):
-            known_items.append(f"📱 Teléfono: {known_data['phone']}")
-        if known_data.get("community"):
-            known_items.append(f"🏢 Comunidad: {known_data['community']}")
-        if known_data.get("address"):
-            known_items.append(f"📍 Dirección: {known_data['address']}")
-        if known_data.get("floor_door"):
-            known_items.append(f"🚪 Piso/Puerta: {known_data['floor_door']}")
+        # Show known data for confirmation, and skip asking for what we have
+        known = [entry for entry in _KNOWN_DATA_FIELDS if known_data.get(entry[0])]
+        known_items = [f"{label}: {known_data[key]}" for key, label, _ in known]
+        fields_we_have = {field for _, _, fields in known for field in fields}
         
         if known_items:
-            response += "*✅ Sus datos registrados:*\n"
-            response += "\n".join(known_items)
-            response += "\n\n"
-        
-        # Filter out fields we already have
-        fields_we_have = set()
-        if known_data.get("phone"):
-            fields_we_have.add("reporter_phone")
-            fields_we_have.add("reporter_contact")
-        if known_data.get("name"):
-            fields_we_have.add("reporter_name")
-        if known_data.get("address"):
-            fields_we_have.add("address")
-        if known_data.get("floor_door"):
-            fields_we_have.add("location_detail")
-        if known_data.get("community"):
-            fields_we_have.add("community_name")
+            parts.append("*✅ Sus datos registrados:*\n")
+            parts.append("\n".join(known_items))
+            parts.append("\n\n")
         
         # If we have a description in the ticket, don't ask for problem_description again
         if ticket.description and len(ticket.description.strip()) > 15:
             fields_we_have.add("problem_description")
         
-        # Get missing fields that we don't already have
-        truly_missing = [f for f in analysis.missing_fields if f not in fields_we_have]
-        
-        # Filter out non-essential fields if we have the basics
+        # Get missing fields that we don't already have, keeping only the essential ones
         # Essential: phone (we have via WhatsApp), problem (we have), address OR community
-        essential_fields = {"address", "location_detail"}
-        truly_missing = [f for f in truly_missing if f in essential_fields or f in ("reporter_name",)]
+        truly_missing = [
+            f for f in analysis.missing_fields
+            if f not in fields_we_have and f in self.ESSENTIAL_FOLLOWUP_FIELDS
+        ]
         
         if truly_missing:
-            response += "━━━━━━━━━━━━━━━━━━━━━━\n"
-            response += "⚠️ *Para poder gestionar su incidencia necesitamos:*\n\n"
+            parts.append(_FOLLOWUP_MISSING_HEADER)
             
             # Convert technical field names to friendly Spanish with examples
-            field_examples = {
-                "reporter_name": ("Su nombre completo", "Ej: Juan García"),
-                "address": ("Dirección del edificio", "Ej: Calle Mayor 15"),
-                "location_detail": ("Piso y puerta", "Ej: 3º A"),
-            }
-            
-            for i, field in enumerate(truly_missing, 1):
-                field_info = field_examples.get(field, (self.FIELD_NAMES_ES.get(field, field), ""))
-                name, example = field_info
+            for field in truly_missing:
+                name, example = self.FIELD_EXAMPLES_ES.get(field) or (self.FIELD_NAMES_ES.get(field, field), "")
                 if example:
-                    response += f"• *{name}* _{example}_\n"
+                    parts.append(f"• *{name}* _{example}_\n")
                 else:
-                    response += f"• *{name}*\n"
+                    parts.append(f"• *{name}*\n")
             
-            response += "\n📩 Por favor, indíquenos estos datos."
+            parts.append("\n📩 Por favor, indíquenos estos datos.")
         else:
             # No missing essential fields - confirm we're processing
-            response += """✅ Tenemos la información necesaria. Estamos procesando su incidencia.
-
-_Le notificaremos cuando esté resuelto._"""
+            parts.append(_FOLLOWUP_COMPLETE_TEXT)
         
-        return response
+        return "".join(parts)
     
     async def send_message(self, to_phone: str, message: str) -> bool:
         """Send a WhatsApp message."""
@@ -1333,7 +1692,9 @@ _Le notificaremos cuando esté resuelto._"""
             to_number = f"whatsapp:{to_phone}" if not to_phone.startswith("whatsapp:") else to_phone
             from_number = f"whatsapp:{settings.twilio_whatsapp_number}"
             
-            message = self.client.messages.create(
+            # The Twilio client is synchronous; keep its HTTP call off the event loop
+            message = await asyncio.to_thread(
+                self.client.messages.create,
                 body=message,
                 from_=from_number,
                 to=to_number,
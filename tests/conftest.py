@@ -0,0 +1,37 @@
+"""
+Shared test fixtures
+"""
+import pytest_asyncio
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.database import Base
+from app.models import Event, Reporter, Ticket
+
+
+@pytest_asyncio.fixture
+async def db():
+    """Session on a fresh in-memory SQLite database with the tables the services touch"""
+    engine = create_async_engine("sqlite+aiosqlite://")
+    
+    # Let SQLAlchemy emit BEGIN itself so SAVEPOINT (begin_nested) works on sqlite
+    @event.listens_for(engine.sync_engine, "connect")
+    def _disable_driver_transactions(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+    
+    @event.listens_for(engine.sync_engine, "begin")
+    def _begin(conn):
+        conn.exec_driver_sql("BEGIN")
+    
+    async with engine.begin() as conn:
+        await conn.run_sync(
+            Base.metadata.create_all,
+            tables=[Ticket.__table__, Event.__table__, Reporter.__table__],
+        )
+    
+    session_factory = async_sessionmaker(
+        engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
+    )
+    async with session_factory() as session:
+        yield session
+    await engine.dispose()
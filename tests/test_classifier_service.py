@@ -0,0 +1,40 @@
+"""
+Tests for the classifier's digest-keyed result caches
+"""
+from app.models.ticket import Category
+from app.services import classifier_service
+from app.services.classifier_service import ClassifierService
+
+
+def test_classification_is_cached_by_digest():
+    body = "Hay una fuga de agua en el portal " * 200
+    service = ClassifierService()
+
+    first = service.classify_email("Fuga", body)
+    second = service.classify_email("Fuga", body)
+
+    assert first == second
+    assert first[0] == Category.WATER
+    key = classifier_service._text_digest(f"Fuga {body}".lower())
+    assert classifier_service._classification_cache[key] == first
+    assert all(len(k) == 16 for k in classifier_service._classification_cache)
+
+
+def test_missing_community_is_cached_too():
+    service = ClassifierService()
+
+    assert service.extract_community_name("vecino@example.com", "Sin datos") is None
+    key = classifier_service._text_digest("vecino@example.com Sin datos")
+    assert key in classifier_service._community_cache
+    assert service.extract_community_name("vecino@example.com", "Sin datos") is None
+
+
+def test_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr(classifier_service, "CLASSIFIER_CACHE_SIZE", 2)
+    monkeypatch.setattr(classifier_service, "_classification_cache", classifier_service.OrderedDict())
+    service = ClassifierService()
+
+    for i in range(5):
+        service.classify_email(f"Aviso {i}", "texto")
+
+    assert len(classifier_service._classification_cache) == 2
@@ -0,0 +1,124 @@
+"""
+Tests for the IMAP poller's batched fetch, seen-flagging rule and shutdown
+"""
+import threading
+import time
+
+from app.config import get_settings
+from app.services.email_service import IMAPPoller
+
+RAW_EMAIL = (
+    b"From: Vecino <vecino@example.com>\r\n"
+    b"To: incidencias@example.com\r\n"
+    b"Subject: Fuga de agua\r\n"
+    b"Message-ID: <abc@example.com>\r\n"
+    b"\r\n"
+    b"Hay una fuga en el portal.\r\n"
+)
+BROKEN_EMAIL = b"not an email"
+
+
+class FakeIMAPClient:
+    """In-memory stand-in for an IMAP session on INBOX"""
+
+    def __init__(self, messages: dict):
+        self.messages = messages
+        self.flagged = []
+        self.fetch_items = []
+        self.calls = []
+
+    def noop(self):
+        pass
+
+    def select_folder(self, folder):
+        pass
+
+    def search(self, criteria):
+        return sorted(self.messages)
+
+    def fetch(self, uids, items):
+        self.fetch_items.append(items)
+        return {uid: {b"BODY[]": self.messages[uid]} for uid in uids}
+
+    def add_flags(self, uids, flags):
+        self.flagged.append((list(uids), flags))
+
+    def has_capability(self, capability):
+        return capability == "IDLE"
+
+    def idle(self):
+        self.calls.append("idle")
+
+    def idle_check(self, timeout):
+        time.sleep(0.05)
+        return []
+
+    def idle_done(self):
+        self.calls.append("idle_done")
+
+    def logout(self):
+        self.calls.append("logout")
+
+
+def _poller(client: FakeIMAPClient, monkeypatch) -> IMAPPoller:
+    poller = IMAPPoller()
+    poller._client = client
+    poller._last_used = time.monotonic()
+    parse = poller._parse_email
+    # Treat BROKEN_EMAIL as a message the parser can't handle
+    monkeypatch.setattr(
+        poller, "_parse_email", lambda raw, now=None: None if raw == BROKEN_EMAIL else parse(raw, now)
+    )
+    return poller
+
+
+def test_fetch_does_not_set_seen_implicitly(monkeypatch):
+    client = FakeIMAPClient({1: RAW_EMAIL})
+
+    _poller(client, monkeypatch).fetch_unread_emails()
+
+    assert client.fetch_items == [["BODY.PEEK[]"]]
+
+
+def test_parsed_and_unparseable_messages_are_flagged_seen(monkeypatch):
+    client = FakeIMAPClient({1: RAW_EMAIL, 2: BROKEN_EMAIL})
+
+    emails = _poller(client, monkeypatch).fetch_unread_emails()
+
+    assert [email["uid"] for email in emails] == [1]
+    assert emails[0]["subject"] == "Fuga de agua"
+    assert client.flagged == [([1, 2], ["\\Seen"])]
+
+
+def test_messages_parsed_across_fetch_batches(monkeypatch):
+    monkeypatch.setattr(get_settings(), "imap_fetch_batch_size", 1)
+    client = FakeIMAPClient({1: RAW_EMAIL, 2: BROKEN_EMAIL, 3: RAW_EMAIL})
+
+    emails = _poller(client, monkeypatch).fetch_unread_emails()
+
+    assert [email["uid"] for email in emails] == [1, 3]
+    assert len(client.fetch_items) == 3
+    assert client.flagged == [([1, 2, 3], ["\\Seen"])]
+
+
+def test_nothing_flagged_without_unread_mail(monkeypatch):
+    client = FakeIMAPClient({})
+
+    assert _poller(client, monkeypatch).fetch_unread_emails() == []
+    assert client.flagged == []
+
+
+def test_shutdown_waits_for_idle_to_finish(monkeypatch):
+    client = FakeIMAPClient({})
+    poller = _poller(client, monkeypatch)
+    stop = threading.Event()
+    idling = threading.Thread(target=poller.wait_for_new_mail, args=(30, stop.is_set))
+    idling.start()
+    while "idle" not in client.calls:
+        time.sleep(0.001)
+
+    stop.set()
+    poller.shutdown()
+    idling.join()
+
+    assert client.calls == ["idle", "idle_done", "logout"]
@@ -0,0 +1,105 @@
+"""
+Tests for ticket creation and its ticket_code collision retry
+"""
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from app.models import Category, Event, Priority, Reporter, Ticket
+from app.schemas import TicketCreate
+from app.services.ticket_service import TicketService, _is_ticket_code_collision
+
+
+def _ticket_data() -> TicketCreate:
+    return TicketCreate(
+        subject="Fuga de agua en el portal",
+        description="Hay agua saliendo por debajo de la puerta",
+        category=Category.WATER,
+        priority=Priority.HIGH,
+        reporter_email="vecino@example.com",
+        reporter_name="Vecino",
+    )
+
+
+def _codes(service: TicketService, *codes: str) -> None:
+    """Make the service hand out the given ticket codes in order"""
+    pending = iter(codes)
+    service._generate_ticket_code = lambda: next(pending)
+
+
+async def _count(db, model) -> int:
+    return (await db.execute(select(func.count()).select_from(model))).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_collision_retries_with_new_code(db):
+    service = TicketService(db)
+    _codes(service, "INC-AAAAAA", "INC-AAAAAA", "INC-BBBBBB")
+    await service.create_ticket(_ticket_data())
+
+    ticket = await service.create_ticket(_ticket_data())
+
+    assert ticket.ticket_code == "INC-BBBBBB"
+    assert await _count(db, Ticket) == 2
+    assert await _count(db, Event) == 2
+
+
+@pytest.mark.asyncio
+async def test_collision_keeps_callers_pending_work(db):
+    service = TicketService(db)
+    _codes(service, "INC-AAAAAA", "INC-AAAAAA", "INC-BBBBBB")
+    await service.create_ticket(_ticket_data())
+
+    # A new reporter flushed before the ticket, as the WhatsApp flow does
+    db.add(Reporter(name="WhatsApp 5678", email="whatsapp_34612345678@wa.placeholder.com"))
+    await db.flush()
+    await service.create_ticket(_ticket_data(), commit=False)
+    await db.commit()
+
+    assert await _count(db, Reporter) == 1
+    assert await _count(db, Ticket) == 2
+
+
+@pytest.mark.asyncio
+async def test_gives_up_after_max_attempts(db):
+    service = TicketService(db)
+    _codes(service, "INC-AAAAAA", "INC-AAAAAA", "INC-AAAAAA", "INC-AAAAAA")
+    await service.create_ticket(_ticket_data())
+
+    with pytest.raises(IntegrityError):
+        await service.create_ticket(_ticket_data())
+
+
+@pytest.mark.asyncio
+async def test_other_integrity_errors_are_not_retried(db):
+    service = TicketService(db)
+    attempts = []
+
+    async def failing_event(*args, **kwargs):
+        attempts.append(args)
+        raise IntegrityError("INSERT INTO events", {}, Exception("NOT NULL constraint failed: events.event_type"))
+
+    service._create_event = failing_event
+
+    with pytest.raises(IntegrityError):
+        await service.create_ticket(_ticket_data())
+    assert len(attempts) == 1
+
+
+class _DriverError(Exception):
+    """Driver error carrying the violated constraint, like asyncpg's"""
+
+    def __init__(self, message: str, constraint_name: str):
+        super().__init__(message)
+        self.constraint_name = constraint_name
+
+
+@pytest.mark.parametrize("orig, expected", [
+    (_DriverError("duplicate key", "ix_tickets_ticket_code"), True),
+    (_DriverError("duplicate key", "ix_reporters_email"), False),
+    (Exception('duplicate key value violates unique constraint "ix_tickets_ticket_code"'), True),
+    (Exception("UNIQUE constraint failed: tickets.ticket_code"), True),
+    (Exception('null value in column "subject" violates not-null constraint'), False),
+])
+def test_is_ticket_code_collision(orig, expected):
+    assert _is_ticket_code_collision(IntegrityError("INSERT", {}, orig)) is expected
@@ -0,0 +1,132 @@
+"""
+Tests for the WhatsApp reporter merge, intent detection and retry handling
+"""
+import asyncio
+
+import pytest
+
+from app.models import Reporter, Ticket, TicketStatus
+from app.services.whatsapp_service import WhatsAppService
+
+
+async def _reporter(db, **fields) -> Reporter:
+    reporter = Reporter(
+        name=fields.pop("name", "WhatsApp 5678"),
+        email="whatsapp_34612345678@wa.placeholder.com",
+        phone="+34612345678",
+        **fields,
+    )
+    db.add(reporter)
+    await db.commit()
+    return reporter
+
+
+@pytest.mark.asyncio
+async def test_fills_empty_fields_and_refreshes_instance(db):
+    reporter = await _reporter(db)
+
+    await WhatsAppService(db)._merge_reporter_info(
+        reporter, address="Calle Mayor 1", floor_door="3º A", name="Ana García"
+    )
+
+    # The loaded instance reflects the UPDATE without a separate refresh
+    assert reporter.address == "Calle Mayor 1"
+    assert reporter.floor_door == "3º A"
+    assert reporter.name == "Ana García"
+
+
+@pytest.mark.asyncio
+async def test_keeps_existing_data(db):
+    reporter = await _reporter(db, name="Ana García", address="Calle Mayor 1", floor_door="2º B")
+
+    await WhatsAppService(db)._merge_reporter_info(
+        reporter, address="Otra calle 5", floor_door="3º A", name="Otro nombre"
+    )
+
+    assert reporter.address == "Calle Mayor 1"
+    assert reporter.floor_door == "2º B"
+    assert reporter.name == "Ana García"
+
+
+@pytest.mark.asyncio
+async def test_replaces_room_name_stored_as_floor_door(db):
+    reporter = await _reporter(db, floor_door="baño")
+
+    await WhatsAppService(db)._merge_reporter_info(reporter, floor_door="3º A")
+
+    assert reporter.floor_door == "3º A"
+
+
+@pytest.mark.asyncio
+async def test_clears_room_name_without_replacement(db):
+    reporter = await _reporter(db, floor_door="cocina")
+
+    await WhatsAppService(db)._merge_reporter_info(reporter)
+
+    assert reporter.floor_door is None
+
+
+@pytest.mark.asyncio
+async def test_intent_cache_is_not_shared_between_users_tickets(db):
+    message = "Quería saber cómo va lo que os comenté la semana pasada"
+    service = WhatsAppService(db)
+    service.ai_agent.client = object()
+    prompts = []
+
+    async def classify_json(system_prompt, prompt, **kwargs):
+        prompts.append(prompt)
+        code = "INC-0001" if "INC-0001" in prompt else "INC-0002"
+        return {"intent": "CHECK_STATUS", "ticket_code": code}
+
+    service._classify_json = classify_json
+    first = Ticket(ticket_code="INC-0001", status=TicketStatus.IN_PROGRESS)
+    second = Ticket(ticket_code="INC-0002", status=TicketStatus.IN_PROGRESS)
+
+    _, data_a = await service._detect_user_intent(message, None, [first])
+    _, data_b = await service._detect_user_intent(message, None, [second])
+    _, data_a_again = await service._detect_user_intent(message, None, [first])
+
+    assert data_a["ticket_code"] == "INC-0001"
+    assert data_b["ticket_code"] == "INC-0002"
+    assert data_a_again == data_a
+    assert len(prompts) == 2
+
+
+@pytest.mark.asyncio
+async def test_retry_during_processing_waits_for_the_first_reply(db):
+    calls = []
+
+    async def respond(phone, body, profile_name):
+        calls.append(body)
+        await asyncio.sleep(0.01)
+        return f"respuesta {len(calls)}"
+
+    first, retry = WhatsAppService(db), WhatsAppService(db)
+    first._respond_to_message = retry._respond_to_message = respond
+
+    replies = await asyncio.gather(
+        first.process_incoming_message("whatsapp:+34612345678", "Hay una fuga", "SM-retry-1"),
+        retry.process_incoming_message("whatsapp:+34612345678", "Hay una fuga", "SM-retry-1"),
+    )
+    again = await retry.process_incoming_message("whatsapp:+34612345678", "Hay una fuga", "SM-retry-1")
+
+    assert replies == ["respuesta 1", "respuesta 1"]
+    assert again == "respuesta 1"
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_same_text_with_a_new_sid_is_processed_again(db):
+    calls = []
+
+    async def respond(phone, body, profile_name):
+        calls.append(body)
+        return "sí"
+
+    service = WhatsAppService(db)
+    service._respond_to_message = respond
+
+    await service.process_incoming_message("whatsapp:+34612345678", "Sí", "SM-repeat-1")
+    await service.process_incoming_message("whatsapp:+34612345678", "Sí", "SM-repeat-2")
+
+    assert calls == ["Sí", "Sí"]